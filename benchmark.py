@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+# Benchmarks of the pipeline stages, on synthetic flights
+#
+# Times each analysis stage on flights of different length and logger rate,
+# and the whole stats and website pipeline on seasons of different size.
+# Results are compared to a stored baseline, and slower stages are reported.
+
+import argparse
+import gzip
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import igc
+import kreise
+import landepunkt
+import sektoren
+import synthigc
+import zonen
+
+repo = os.path.dirname(os.path.abspath(__file__))
+
+# (duration, rate) of the flights the stages are timed on
+flight_kinds = [
+    (30 * 60, 1),
+    (30 * 60, 5),
+    (2 * 3600, 1),
+    (8 * 3600, 1),
+    (8 * 3600, 5),
+]
+
+# the exact per-fix lookup is slow, so it is only timed on a sample
+sample_size = 2000
+
+def measure(f, repeat):
+    # best wall time of repeat runs, and peak traced memory of one run
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    f()
+    (_, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (best, peak)
+
+def stages(repeat):
+    results = {}
+    sektor_zonen = zonen.from_geojson(sektoren.geojson())
+    for (duration, rate) in flight_kinds:
+        data = synthigc.flight(seed = duration + rate, duration = duration, rate = rate)
+        track = igc.parse_array(data)
+        sample = track[:sample_size]
+        kind = f"{duration // 60}min@{rate}Hz"
+
+        for (name, f, n) in [
+            ('igc.parse_array', lambda: igc.parse_array(data), len(track)),
+            ('igc.parse', lambda: igc.parse(io.BytesIO(data)), len(track)),
+            ('sektoren.sektoren', lambda: sektoren.sektoren(track), len(track)),
+            ('zonen.zonen', lambda: sektor_zonen.zonen(track), len(track)),
+            ('sektoren.sektor_of_point', lambda: [ sektoren.sektor_of_point((p['lat'], p['lon'])) for p in sample ], len(sample)),
+            ('kreise.turns', lambda: kreise.turns(track), len(track)),
+            ('landepunkt.landepunkt', lambda: landepunkt.landepunkt(track), len(track)),
+            ]:
+            (seconds, peak) = measure(f, repeat)
+            results[f"{name} {kind}"] = {
+                'seconds': seconds,
+                'throughput': n / seconds,
+                'unit': 'fixes/s',
+                'peak_memory': peak,
+            }
+            print(f"{name:26} {kind:12} {n / seconds:14,.0f} fixes/s {peak / 2**20:8.1f} MiB")
+    return results
+
+def season(directory, size, seed = 0):
+    # a season of synthetic flights in directory, laid out like the real one
+    rnd = random.Random(seed)
+    os.makedirs(f"{directory}/_flights")
+    os.makedirs(f"{directory}/_tmp")
+    os.makedirs(f"{directory}/_out")
+    for name in ['templates', 'data2024.json']:
+        os.symlink(f"{repo}/{name}", f"{directory}/{name}")
+
+    # a pool of distinct tracks, every file still gets its own content
+    pool = [ synthigc.flight(seed = n, duration = rnd.choice([1800, 3600, 2 * 3600, 4 * 3600]),
+        rate = rnd.choice([1, 1, 1, 5])) for n in range(min(size, 50)) ]
+    pilots = [ str(1000 + n) for n in range(max(1, size // 20)) ]
+
+    flights_data = []
+    for n in range(size):
+        id = str(3000000 + n)
+        data = pool[n % len(pool)] + f"LXXXSYN flight {id}\r\n".encode()
+        with open(f"{directory}/_flights/{id}.igc.gz", 'wb') as f:
+            f.write(gzip.compress(data, 1, mtime=0))
+        date = f"2025-{4 + n * 6 // size:02d}-{1 + n % 28:02d}"
+        pid = rnd.choice(pilots)
+        flights_data.append({
+            'IDFlight': id,
+            'FKPilot': pid,
+            'FirstName': 'Pilot',
+            'LastName': pid,
+            'FlightDate': date,
+            'FlightStartTime': f"{date} 10:00:00",
+            'FlightDuration': str(rnd.randint(600, 4 * 3600)),
+            'TakeoffWaypointName': rnd.choice(['Schauinsland', 'Lindenberg']),
+            'CountComments': "0",
+            'HasPhotos': rnd.choice(["0", "1"]),
+        })
+    with open(f"{directory}/_tmp/flights.json", 'w') as f:
+        json.dump(flights_data, f)
+
+# Runs a script and writes its own peak RSS and that of its largest worker
+# process in kB to a file; ru_maxrss of a child would include the RSS of this
+# process at fork time, so the script's own peak is read from /proc instead
+measure_script = """
+import atexit, os, resource, runpy, sys
+output = sys.argv[1]
+def peak():
+    workers = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    for line in open('/proc/self/status'):
+        if line.startswith('VmHWM:'):
+            with open(output, 'w') as f:
+                f.write(f"{line.split()[1]} {workers}")
+atexit.register(peak)
+script = sys.argv[2]
+sys.argv = sys.argv[2:]
+sys.path.insert(0, os.path.dirname(script))
+runpy.run_path(script, run_name='__main__')
+"""
+
+def run(directory, script, *args):
+    # wall time, peak RSS of one pipeline script and of its largest worker
+    with tempfile.NamedTemporaryFile() as peak:
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', measure_script, peak.name, f"{repo}/{script}", *args],
+            cwd = directory, stdout = subprocess.DEVNULL, check = True)
+        seconds = time.perf_counter() - start
+        (own, workers) = open(peak.name).read().split()
+        return (seconds, int(own) * 1024, int(workers) * 1024)
+
+def pipeline(sizes):
+    results = {}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            print(f"Generating season of {size} flights")
+            season(directory, size)
+            for (name, script, args) in [
+                ('update-flightstats', 'update-flightstats.py', []),
+                ('update-flightstats (cached)', 'update-flightstats.py', []),
+                ('website', 'website.py', []),
+                ]:
+                (seconds, peak, worker_peak) = run(directory, script, *args)
+                results[f"{name} {size}"] = {
+                    'seconds': seconds,
+                    'throughput': size / seconds,
+                    'unit': 'flights/s',
+                    'peak_memory': peak,
+                    'peak_memory_worker': worker_peak,
+                }
+                print(f"{name:28} {size:6} flights {size / seconds:10,.1f} flights/s {peak / 2**20:8.1f} MiB"
+                    f" {worker_peak / 2**20:8.1f} MiB per worker")
+    return results
+
+def compare(results, baseline, tolerance):
+    # names of the benchmarks that got slower than the baseline allows
+    regressions = []
+    for name, result in results.items():
+        if name in baseline and result['seconds'] > baseline[name]['seconds'] * (1 + tolerance):
+            regressions.append(name)
+            print(f"Regression: {name} took {result['seconds']:.3f}s, baseline {baseline[name]['seconds']:.3f}s")
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline on synthetic flights')
+    parser.add_argument('--sizes', default='100,2000,20000',
+        help='Comma separated season sizes for the pipeline benchmark (default: 100,2000,20000)')
+    parser.add_argument('--no-pipeline', action='store_true',
+        help='Only benchmark the single stages')
+    parser.add_argument('--repeat', type=int, default=3,
+        help='Runs per stage, the best is reported (default: 3)')
+    parser.add_argument('--baseline', default='_tmp/benchmark-baseline.json',
+        help='Baseline to compare against (default: _tmp/benchmark-baseline.json)')
+    parser.add_argument('--save', action='store_true',
+        help='Store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+        help='Relative slowdown that counts as a regression (default: 0.2)')
+    parser.add_argument('-o', '--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    results = stages(args.repeat)
+    if not args.no_pipeline:
+        results.update(pipeline([ int(s) for s in args.sizes.split(',') ]))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=True)
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=True)
+
+    if regressions:
+        sys.exit(1)
@@ -17,8 +17,13 @@ lpradius1 = 10
 lpradius2 = 25
 lpradius3 = 50
 
-radius = [r0 + dr0 * (drf**i - 1)/(drf-1) for i in range(rings) ]
-segments = [ 2**(round(math.log(2*math.pi*(radius[i]+radius[i+1])/2 / (radius[i+1]-radius[i]), 2))) for i in range(rings-1) ]
-offset = [0 for i in range(rings-1)]
-for i in range(1,rings-1):
-    offset[i] = offset[i-1] + 0.5 * 360/segments[i]
+def layout(rings, r0, dr0, drf):
+    # radii of the rings, and segments and offset of each ring outside the first
+    radius = [r0 + dr0 * (drf**i - 1)/(drf-1) for i in range(rings) ]
+    segments = [ 2**(round(math.log(2*math.pi*(radius[i]+radius[i+1])/2 / (radius[i+1]-radius[i]), 2))) for i in range(rings-1) ]
+    offset = [0 for i in range(rings-1)]
+    for i in range(1,rings-1):
+        offset[i] = offset[i-1] + 0.5 * 360/segments[i]
+    return (radius, segments, offset)
+
+(radius, segments, offset) = layout(rings, r0, dr0, drf)
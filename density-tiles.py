@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+
+# Renders the density tiles of all tracks for map_all.html
+
+import json
+
+import density
+import timings
+
+flight_data = json.load(open('_tmp/flights.json'))
+
+# Group flights by date
+flights_by_date = {}
+for flight in flight_data:
+    date = flight["FlightDate"]
+    if date not in flights_by_date:
+        flights_by_date[date] = []
+    flights_by_date[date].append(flight)
+
+with timings.stage('density-tiles') as stage:
+    (tiles, written, removed, changed) = density.update(flights_by_date)
+    print(f"Density tiles: {changed} days changed, {tiles} tiles, {written} written, {removed} removed")
+    stage.count('days', len(flights_by_date))
+    stage.count('days changed', changed)
+    stage.count('tiles', tiles)
+    stage.count('tiles written', written)
+    stage.count('tiles removed', removed)
@@ -0,0 +1,195 @@
+# Density raster of all tracks, rendered as XYZ tiles
+#
+# Every track is rasterized into web mercator pixels at max_zoom, along the
+# segments between its fixes; a pixel counts the flights that passed through it.
+# Rasters are kept per day in _density/, so that only days with new or changed
+# flights need to be rasterized again. The contents of every tile are hashed,
+# and only tiles whose contents changed are encoded again.
+
+import hashlib
+import json
+import math
+import os
+import struct
+import zlib
+import numpy as np
+
+import render
+import trackcache
+
+# bump when the rasters or the tiles change
+version = 2
+
+min_zoom = 8
+max_zoom = 14
+tile_size = 256
+day_dir = "_density"
+tile_dir = "_out/density"
+
+# day digests and tile hashes of the tiles in tile_dir
+state_file = f"{day_dir}/tiles.json"
+
+# segments longer than this many pixels are gaps in the track, not drawn
+max_gap = tile_size
+
+# colour of the tracks, alpha scales with the density
+colour = (220, 20, 60)
+
+# zlib level of the tiles; 9 takes 20 times as long for 10% smaller tiles
+png_level = 6
+
+def pixels(lat, lon, zoom = max_zoom):
+    # global web mercator pixel coordinates, not rounded
+    n = tile_size * 2**zoom
+    x = (np.asarray(lon) + 180) / 360 * n
+    phi = np.radians(lat)
+    y = (1 - np.log(np.tan(phi) + 1 / np.cos(phi)) / math.pi) / 2 * n
+    return (x, y)
+
+def cells(track):
+    # the distinct pixels a track passes through, as x << 32 | y; every segment
+    # gets one point per pixel of its length, so fast glides are not dotted
+    (x, y) = pixels(track['lat'], track['lon'])
+    if len(x) > 1:
+        (dx, dy) = (np.diff(x), np.diff(y))
+        steps = np.ceil(np.maximum(np.abs(dx), np.abs(dy))).astype(np.int64)
+        steps = np.where(steps > max_gap, 1, np.maximum(steps, 1))
+        segment = np.repeat(np.arange(len(steps)), steps)
+        t = (np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)) / steps[segment]
+        x = np.append(x[segment] + dx[segment] * t, x[-1])
+        y = np.append(y[segment] + dy[segment] * t, y[-1])
+    return np.unique(np.floor(x).astype(np.int64) << 32 | np.floor(y).astype(np.int64))
+
+def count(keys):
+    # per pixel, how many of the given pixel sets contain it
+    return np.unique(np.concatenate([np.zeros(0, np.int64)] + keys), return_counts=True)
+
+def filenames(flights):
+    return sorted(f"_flights/{flight['IDFlight']}.igc.gz" for flight in flights)
+
+def day_digest(flights):
+    # changes when the flights of the day or their tracks change
+    return hashlib.sha256(" ".join([str(version)] + [
+        f"{f}:{trackcache.digest(f)}" for f in filenames(flights) ]).encode()).hexdigest()
+
+def day_raster(date, flights, digest):
+    # (keys, counts) of one day, from _density/ if the day's flights are unchanged
+    path = f"{day_dir}/{date}.npz"
+    if os.path.exists(path):
+        with np.load(path) as cached:
+            if str(cached['digest']) == digest:
+                return (cached['keys'], cached['counts'])
+
+    print(f"Rasterizing {len(flights)} flights of {date}")
+    (keys, counts) = count([ cells(trackcache.load(f)) for f in filenames(flights) ])
+    os.makedirs(day_dir, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        np.savez(f, keys=keys, counts=counts, digest=digest)
+    os.replace(tmp, path)
+    return (keys, counts)
+
+def season_raster(flights_by_date, digests):
+    keys = []
+    counts = []
+    for date in sorted(flights_by_date):
+        (k, c) = day_raster(date, flights_by_date[date], digests[date])
+        keys.append(k)
+        counts.append(c)
+    if not keys:
+        return (np.zeros(0, np.int64), np.zeros(0, np.int64))
+    (keys, inverse) = np.unique(np.concatenate(keys), return_inverse=True)
+    return (keys, np.bincount(inverse, weights=np.concatenate(counts)).astype(np.int64))
+
+def png(rgba):
+    (height, width, _) = rgba.shape
+    raw = b''.join(b'\x00' + row.tobytes() for row in rgba)
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    return b'\x89PNG\r\n\x1a\n' + \
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)) + \
+        chunk(b'IDAT', zlib.compress(raw, png_level)) + \
+        chunk(b'IEND', b'')
+
+def tile_png(x, y, alpha):
+    # x and y within the tile
+    rgba = np.zeros((tile_size, tile_size, 4), dtype=np.uint8)
+    rgba[..., :3] = colour
+    rgba[y, x, 3] = alpha
+    return png(rgba)
+
+def tiles(keys, counts):
+    # (zoom, x, y, pixel x, pixel y, alpha) for every non-empty tile, pixels within the tile
+    if len(keys) == 0:
+        return
+    for zoom in range(max_zoom, min_zoom - 1, -1):
+        shift = max_zoom - zoom
+        x = (keys >> 32) >> shift
+        y = (keys & 0xffffffff) >> shift
+        (zkeys, inverse) = np.unique(x << 32 | y, return_inverse=True)
+        zcounts = np.bincount(inverse, weights=counts)
+        x = zkeys >> 32
+        y = zkeys & 0xffffffff
+        alpha = np.rint(40 + 215 * np.log1p(zcounts) / np.log1p(zcounts.max())).astype(np.uint8)
+
+        tile = (x // tile_size) << 32 | (y // tile_size)
+        order = np.argsort(tile, kind='stable')
+        (tile_keys, starts) = np.unique(tile[order], return_index=True)
+        for (t, part) in zip(tile_keys.tolist(), np.split(order, starts[1:])):
+            yield (zoom, t >> 32, t & 0xffffffff, x[part] % tile_size, y[part] % tile_size, alpha[part])
+
+def load_state():
+    # without tiles, the state of the last run does not matter
+    try:
+        if os.path.isdir(tile_dir):
+            with open(state_file) as f:
+                return json.load(f)
+    except FileNotFoundError:
+        pass
+    return {'days': {}, 'tiles': {}}
+
+def save_state(state):
+    os.makedirs(day_dir, exist_ok=True)
+    render.write_if_changed(state_file, json.dumps(state).encode())
+
+def write_tiles(keys, counts, hashes = {}):
+    # writes the tiles whose contents are not in hashes, removes tiles that are
+    # no longer there; (tiles, written, removed, new hashes)
+    written = 0
+    present = {}
+    for (zoom, x, y, px, py, alpha) in tiles(keys, counts):
+        path = f"{tile_dir}/{zoom}/{x}/{y}.png"
+        hash = hashlib.sha256(b"".join([str(version).encode(), bytes(colour),
+            px.astype('<i8').tobytes(), py.astype('<i8').tobytes(), alpha.tobytes()])).hexdigest()
+        present[path] = hash
+        if hashes.get(path) == hash and os.path.exists(path):
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if render.write_if_changed(path, tile_png(px, py, alpha)):
+            written += 1
+
+    removed = 0
+    for (dirpath, _, names) in os.walk(tile_dir, topdown=False):
+        for filename in names:
+            path = f"{dirpath}/{filename}"
+            if path not in present:
+                os.remove(path)
+                removed += 1
+        if dirpath != tile_dir and not os.listdir(dirpath):
+            os.rmdir(dirpath)
+    return (len(present), written, removed, present)
+
+def update(flights_by_date):
+    # (tiles, written, removed, changed days), nothing is done if no day changed
+    state = load_state()
+    digests = { date: day_digest(flights) for date, flights in flights_by_date.items() }
+    if digests == state['days']:
+        return (len(state['tiles']), 0, 0, 0)
+    changed = sum(1 for date in digests if state['days'].get(date) != digests[date])
+    (keys, counts) = season_raster(flights_by_date, digests)
+    (tiles, written, removed, hashes) = write_tiles(keys, counts, state['tiles'])
+    for date in set(state['days']) - set(digests):
+        if os.path.exists(f"{day_dir}/{date}.npz"):
+            os.remove(f"{day_dir}/{date}.npz")
+    save_state({'days': digests, 'tiles': hashes})
+    return (tiles, written, removed, changed)
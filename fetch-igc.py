@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+# Downloads the missing IGC files, comments and photo manifests of the flights
+# in _tmp/flights.json, over a few keep-alive connections
+
+import argparse
+import gzip
+import http.client
+import http.cookiejar
+import json
+import os
+import re
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import timings
+
+# seconds to wait before the first retry, doubled for every further one
+backoff = 1
+
+looks_like_html = re.compile(rb'^\s*<(!doctype html|html|head|body|title)', re.IGNORECASE)
+
+class LooksLikeHTML(Exception):
+    pass
+
+# set on the first HTML response; downloads still running then are not written
+aborted = threading.Event()
+abort_lock = threading.Lock()
+
+class Session:
+    # One persistent connection per worker thread, all sharing the cookie jar
+    def __init__(self, base_url, cookies_file, retries):
+        self.base_url = base_url.rstrip('/')
+        self.base = urllib.parse.urlsplit(self.base_url)
+        self.retries = retries
+        self.jar = http.cookiejar.MozillaCookieJar(cookies_file)
+        if os.path.exists(cookies_file):
+            self.jar.load(ignore_discard=True, ignore_expires=True)
+            # wget stores session cookies with expiry 0
+            for cookie in self.jar:
+                if cookie.expires == 0:
+                    cookie.expires = None
+                    cookie.discard = True
+        self.local = threading.local()
+
+    def connection(self):
+        if getattr(self.local, 'conn', None) is None:
+            if self.base.scheme == 'https':
+                self.local.conn = http.client.HTTPSConnection(self.base.netloc, timeout=60)
+            else:
+                self.local.conn = http.client.HTTPConnection(self.base.netloc, timeout=60)
+        return self.local.conn
+
+    def get(self, path, accept):
+        url = self.base_url + path
+        for attempt in range(self.retries + 1):
+            request = urllib.request.Request(url, headers={'Accept': accept})
+            self.jar.add_cookie_header(request)
+            try:
+                conn = self.connection()
+                conn.request('GET', self.base.path + path, headers=dict(request.header_items()))
+                response = conn.getresponse()
+                body = response.read()
+                self.jar.extract_cookies(response, request)
+                if response.status == 200:
+                    return body
+                error = f"HTTP {response.status}"
+                if response.status < 500 and response.status != 429:
+                    break
+            except (OSError, http.client.HTTPException) as e:
+                # connection() itself may have failed
+                if getattr(self.local, 'conn', None) is not None:
+                    self.local.conn.close()
+                self.local.conn = None
+                error = str(e)
+            if attempt < self.retries:
+                time.sleep(backoff * 2**attempt)
+        raise RuntimeError(f"{url}: {error}")
+
+    def save_cookies(self):
+        for cookie in self.jar:
+            if cookie.expires is None:
+                cookie.expires = 0
+        self.jar.save(ignore_discard=True, ignore_expires=True)
+
+def write(filename, data):
+    tmp = f"{filename}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, filename)
+
+def fetch(session, kind, id, path, accept, filename):
+    # whether the file was written
+    if aborted.is_set():
+        return False
+    print(f"{id}: {kind}")
+    data = session.get(path, accept)
+    if looks_like_html.match(data[:1024]):
+        with abort_lock:
+            aborted.set()
+        raise LooksLikeHTML(f"{id}: This does not look like a {kind} file but like HTML, aborting")
+    if filename.endswith('.gz'):
+        data = gzip.compress(data, 9, mtime=0)
+    with abort_lock:
+        if aborted.is_set():
+            return False
+        write(filename, data)
+    return True
+
+def downloads(flights_data):
+    # (kind, id, path, accept, filename) of everything that is missing
+    for flight in sorted(flights_data, key = lambda f: int(f['IDFlight'])):
+        id = flight['IDFlight']
+        if not os.path.exists(f"_flights/{id}.igc.gz"):
+            yield ('igc', id, f"/flight/{id}/igc", 'application/x-igc', f"_flights/{id}.igc.gz")
+        if flight['CountComments'] != "0" and not os.path.exists(f"_flights/{id}.comments.json"):
+            yield ('comments', id, f"/api/fli/comments?fkflight={id}", 'application/x-igc', f"_flights/{id}.comments.json")
+        if flight['HasPhotos'] == "1" and not os.path.exists(f"images/{id}.json"):
+            yield ('photos', id, f"/api/fli/photos?fkflight={id}", 'application/json', f"images/{id}.json")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Download missing IGC files, comments and photo manifests')
+    parser.add_argument('-j', '--jobs', type=int, default=4,
+        help='Number of parallel connections (default: 4)')
+    parser.add_argument('--retries', type=int, default=4,
+        help='Number of retries per download (default: 4)')
+    parser.add_argument('--base-url', default='https://de.dhv-xc.de',
+        help='Server to download from (default: https://de.dhv-xc.de)')
+    parser.add_argument('--cookies', default='_tmp/cookies.txt',
+        help='Cookie jar in Netscape format (default: _tmp/cookies.txt)')
+    args = parser.parse_args()
+
+    os.makedirs("_flights", exist_ok=True)
+    os.makedirs("images", exist_ok=True)
+    with open("_tmp/flights.json") as f:
+        flights_data = json.load(f)
+
+    session = Session(args.base_url, args.cookies, args.retries)
+    failed = []
+    with timings.stage('fetch-igc') as stage, ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        futures = { executor.submit(fetch, session, *d): d for d in downloads(flights_data) }
+        for future in as_completed(futures):
+            try:
+                if future.result():
+                    stage.count(f"{futures[future][0]} downloaded")
+            except LooksLikeHTML as e:
+                print(e, file=sys.stderr)
+                executor.shutdown(cancel_futures=True)
+                sys.exit(1)
+            except Exception as e:
+                print(f"{futures[future][1]}: {e}", file=sys.stderr)
+                failed.append(futures[future])
+                stage.count(f"{futures[future][0]} failed")
+    session.save_cookies()
+
+    if failed:
+        print(f"Failed to fetch {len(failed)} files", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,26 @@
+#!/usr/bin/env bash
+
+set -e
+
+# Airspaces of Germany in OpenAir format, for the luftraum analyzer; the
+# default is the openAIP export, set LUFTRAUM_URL to use another file.
+# The airspaces are optional: if the download fails, the previous
+# luftraum.txt (or none) is kept and the build goes on.
+url="${LUFTRAUM_URL:-https://storage.googleapis.com/29f98e10-a489-4c82-ae5e-489dbcd4912f/de_asp.txt}"
+
+echo "luftraum.txt: fetching"
+if wget \
+    --no-verbose \
+    --timeout 60 \
+    --tries 3 \
+    "$url" \
+    -O luftraum.txt.tmp && [ -s luftraum.txt.tmp ]; then
+  mv luftraum.txt.tmp luftraum.txt
+else
+  rm -f luftraum.txt.tmp
+  if [ -e luftraum.txt ]; then
+    echo "luftraum.txt: fetching $url failed, keeping the previous file" >&2
+  else
+    echo "luftraum.txt: fetching $url failed, no airspace intrusions" >&2
+  fi
+fi
@@ -20,6 +20,7 @@
         python3Packages.snakeviz
         python3Packages.jinja2
         python3Packages.numpy
+        python3Packages.brotli
         ( python3Packages.buildPythonPackage rec {
           pname = "pyopenair";
           version = "1.2.0"; # 1.2.0 needs shapely-2
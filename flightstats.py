@@ -2,33 +2,97 @@
 
 import math
 import sys
-import subprocess
 import igc
 import argparse
 import json
+import numpy as np
 
 from constants import *
 import kreise
 import sektoren
 import landepunkt
+import trackcache
+import kurbelpartner
+import polarzellen
+import luftraum
 
-parser = argparse.ArgumentParser(description='TODO')
-parser.add_argument('-i', type=str, help='Gzipped IGC file to analyzse', required=True)
-args = parser.parse_args()
-
-gunzip = subprocess.Popen(('gunzip',), stdin=open(args.i), stdout=subprocess.PIPE)
-#gpsbabel = subprocess.Popen(('gpsbabel', '-i', 'igc', '-o', 'gpx', '-f', '-', '-F', '-'), stdin=gunzip.stdout, stdout=subprocess.PIPE)
-track = igc.parse(gunzip.stdout)
-
-p = landepunkt.landepunkt(track)
-landepunktabstand = landepunkt.landepunktabstand(p)
-turns = kreise.turns(track)
-seen = sektoren.sektoren(track)
-
-json.dump({
-    'left_turns': turns['left_turns'],
-    'right_turns': turns['right_turns'],
-    'sektoren': sorted([ sektoren.sektorname(isi) for isi in seen]),
-    'landepunkt': p,
-    'landepunktabstand': landepunktabstand,
-}, sys.stdout, indent=True)
+# number of fixes analyzed at once
+chunk_size = 1 << 14
+
+# each analyzer declares a version, bump it when its results change
+analyzers = {
+    'kreise': kreise,
+    'sektoren': sektoren,
+    'landepunkt': landepunkt,
+    'kurbelpartner': kurbelpartner,
+    'polarzellen': polarzellen,
+    'luftraum': luftraum,
+}
+
+# analyzers whose result is an array, not part of the stats of a flight
+array_analyzers = {'polarzellen'}
+
+def flightstats(filename, which = analyzers.keys(), hash = None):
+    # single pass over the track, running only the analyzers in which;
+    # hash is the digest of the file, if known
+    turns = kreise.Turns()
+    seen = set()
+    cells = []
+    intrusions = luftraum.Intrusions()
+    tail = np.zeros(0, dtype=igc.dtype)
+    track = trackcache.load(filename, hash)
+    for start in range(0, len(track), chunk_size):
+        chunk = track[start:start+chunk_size]
+        if 'kreise' in which or 'kurbelpartner' in which:
+            for (lat, lon, time) in zip(chunk['lat'].tolist(), chunk['lon'].tolist(), chunk['time'].tolist()):
+                turns.add(lat, lon, time)
+        if 'sektoren' in which:
+            seen.update(sektoren.sektoren(chunk))
+        if 'polarzellen' in which:
+            cells.append(polarzellen.cells(chunk['lat'], chunk['lon']))
+        if 'luftraum' in which:
+            intrusions.add(chunk)
+        if 'landepunkt' in which:
+            tail = np.concatenate([tail, chunk])[-landepunkt.tail:]
+
+    results = {}
+    if 'kreise' in which:
+        results['kreise'] = turns.result()
+    if 'sektoren' in which:
+        results['sektoren'] = {
+            'sektoren': sorted([ sektoren.sektorname(isi) for isi in seen]),
+        }
+    if 'landepunkt' in which:
+        p = landepunkt.landepunkt(tail)
+        results['landepunkt'] = {
+            'landepunkt': p,
+            'landepunktabstand': landepunkt.landepunktabstand(p),
+        }
+    if 'kurbelpartner' in which:
+        results['kurbelpartner'] = {
+            'kurbelzeiten': kurbelpartner.kurbelzeiten(turns.turn_times),
+        }
+    if 'luftraum' in which:
+        results['luftraum'] = intrusions.result()
+    if 'polarzellen' in which:
+        results['polarzellen'] = np.unique(np.concatenate([np.zeros(0, np.uint32)] + cells))
+    return results
+
+def merge(results):
+    # the flat stats dict of a flight, in the order of analyzers
+    stats = {}
+    for name in analyzers:
+        if name in array_analyzers:
+            continue
+        stats.update(results.get(name, {}))
+    return stats
+
+def write(stats, f):
+    json.dump(stats, f, indent=True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='TODO')
+    parser.add_argument('-i', type=str, help='Gzipped IGC file to analyzse', required=True)
+    args = parser.parse_args()
+
+    write(merge(flightstats(args.i)), sys.stdout)
@@ -0,0 +1,16 @@
+# Hike & fly detection in the comments of a flight
+#
+# A flight counts as hike & fly if its pilot says so in a comment. The index
+# keeps, per comments file, the authors of such comments.
+
+import re
+
+# results depend on the pattern
+version = 1
+
+hike_and_fly_re = re.compile(r'\bhike\b', re.IGNORECASE)
+
+def authors(comments):
+    # pids of the authors that mention a hike, sorted
+    return sorted({ str(c['FKAuthor']) for c in comments['data']
+        if hike_and_fly_re.search(c["CommentText"]) })
@@ -1,30 +1,125 @@
-import re
-
-r = re.compile( r'^B'
-        + r'(\d\d)(\d\d)(\d\d)'
-        + r'(\d\d)(\d\d)(\d\d\d)([NS])'
-        + r'(\d\d\d)(\d\d)(\d\d\d)([EW])'
-        + r'([AV])' + r'([-\d]\d\d\d\d)' + r'([-\d]\d\d\d\d)'
-        + r'([0-9a-zA-Z\-]*).*$')
-def parse(f):
-    track = []
-    for line in f:
-        match = r.match(line.decode('utf8',errors='ignore'))
-        if match is not None:
-            (hours, minutes, seconds,
-             lat_deg, lat_min, lat_min_dec, lat_sign,
-             lon_deg, lon_min, lon_min_dec, lon_sign,
-             validity, press_alt, gnss_alt,
-             extras) = match.groups()
+import gzip
+import numpy as np
+
+# columnar track, one row per B-record
+dtype = np.dtype([('time', 'i4'), ('lat', 'f8'), ('lon', 'f8'), ('alt', 'i4')])
+
+# fixed width layout of a B-record (the first 35 bytes)
+brecord_len = 35
+digits = [*range(1,14), *range(15,22), *range(26,30), *range(31,35)]
+
+def parse_array(data):
+    # all lines that start with B and are long enough to hold a fix
+    lines = [ l for l in data.split(b'\n') if l[:1] == b'B' and len(l) >= brecord_len ]
+    if not lines:
+        return np.zeros(0, dtype=dtype)
+    b = np.frombuffer(b''.join(l[:brecord_len] for l in lines), dtype=np.uint8)
+    b = b.reshape(-1, brecord_len)
+    d = b.astype(np.int32) - ord('0')
+
+    # validate like the regex does
+    ok = np.all((d[:, digits] >= 0) & (d[:, digits] <= 9), axis=1)
+    ok &= (b[:,14] == ord('N')) | (b[:,14] == ord('S'))
+    ok &= (b[:,23] == ord('E')) | (b[:,23] == ord('W'))
+    ok &= (b[:,24] == ord('A')) | (b[:,24] == ord('V'))
+    for c in (25, 30):
+        ok &= ((d[:,c] >= 0) & (d[:,c] <= 9)) | (b[:,c] == ord('-'))
+    b = b[ok]
+    d = d[ok]
+
+    def num(start, end):
+        n = np.zeros(len(d), dtype=np.int32)
+        for c in range(start, end):
+            n = 10 * n + d[:,c]
+        return n
 
-            seconds = 3600*int(hours) + 60*int(minutes) + int(seconds)
+    def alt(start):
+        neg = b[:,start] == ord('-')
+        n = num(start + 1, start + 5)
+        return np.where(neg, -n, n + 10000 * d[:,start])
 
-            lat = float(lat_deg) + float(lat_min) / 60.0 + float(lat_min_dec) / 1000.0 / 60.0
-            if lat_sign == 'S': lat = -lat
+    track = np.zeros(len(d), dtype=dtype)
+    track['time'] = 3600*num(1,3) + 60*num(3,5) + num(5,7)
 
-            lon = float(lon_deg) + float(lon_min) / 60.0 + float(lon_min_dec) / 1000.0 / 60.0
-            if lon_sign == 'W': lon = -lon
+    # same operation order as the float() based parser, so results are identical
+    lat = num(7,9).astype('f8') + num(9,11).astype('f8') / 60.0 + num(11,14).astype('f8') / 1000.0 / 60.0
+    track['lat'] = np.where(b[:,14] == ord('S'), -lat, lat)
 
-            track.append({ 'time': seconds, 'lat': lat, 'lon': lon, 'alt': int(gnss_alt)})
+    lon = num(15,18).astype('f8') + num(18,20).astype('f8') / 60.0 + num(20,23).astype('f8') / 1000.0 / 60.0
+    track['lon'] = np.where(b[:,23] == ord('W'), -lon, lon)
+
+    track['alt'] = alt(30)
     return track
 
+def to_dicts(track):
+    return [ {'time': int(t), 'lat': float(lat), 'lon': float(lon), 'alt': int(alt)}
+             for (t, lat, lon, alt) in np.asarray(track).tolist() ]
+
+# One fix of a Track, read like the dicts of to_dicts: fix['lat'] or fix.lat
+class Fix:
+    __slots__ = ('fixes', 'i')
+
+    def __init__(self, fixes, i):
+        self.fixes = fixes
+        self.i = i
+
+    def __getitem__(self, name):
+        return self.fixes[name][self.i].item()
+
+    def keys(self):
+        return dtype.names
+
+    time = property(lambda self: self['time'])
+    lat = property(lambda self: self['lat'])
+    lon = property(lambda self: self['lon'])
+    alt = property(lambda self: self['alt'])
+
+    def __repr__(self):
+        return repr({ name: self[name] for name in dtype.names })
+
+# A track as a sequence of fixes, stored in columns; slices are views, not copies
+class Track:
+    __slots__ = ('fixes',)
+
+    def __init__(self, fixes):
+        self.fixes = fixes
+
+    def __len__(self):
+        return len(self.fixes)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.fixes[key]
+        if isinstance(key, slice):
+            return Track(self.fixes[key])
+        return Fix(self.fixes, range(len(self.fixes))[key])
+
+    def __iter__(self):
+        return (Fix(self.fixes, i) for i in range(len(self.fixes)))
+
+    def __array__(self, dtype = None, copy = None):
+        return self.fixes if dtype is None else self.fixes.astype(dtype)
+
+def column(track, name):
+    # one column of a columnar track or of a list of fixes
+    if isinstance(track, (np.ndarray, Track)):
+        return track[name]
+    return np.array([ p[name] for p in track ])
+
+def parse(f):
+    return Track(parse_array(f.read()))
+
+# read buffer for compressed track files
+buffer_size = 1 << 20
+
+def stream(filename):
+    # the track in chunks of parsed fixes, without holding the whole file
+    with open(filename, 'rb', buffering=buffer_size) as raw, gzip.GzipFile(fileobj=raw) as f:
+        rest = b''
+        while block := f.read(buffer_size):
+            block = rest + block
+            cut = block.rfind(b'\n') + 1
+            rest = block[cut:]
+            yield parse_array(block[:cut])
+        if rest:
+            yield parse_array(rest)
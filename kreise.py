@@ -2,56 +2,77 @@
 
 import math
 
-def turns(track):
-    left_turns = 0
-    right_turns = 0
-    left_angle = 0
-    right_angle = 0
-
-    if len(track) < 3:
-        return {'left_turns': 0, 'right_turns': 0}
-
-    points = track[:1]
-    for p in track[1:]:
-        if (points[-1]['lat'] - p['lat'])**2 + (points[-1]['lon'] - p['lon'])**2 > 1e-8:
-            points.append(p)
-
-    dir = 0
-    max_dir = 0
-    min_dir = 0
-
-    for i in range (1, len(points)-1):
-        x0 = points[i-1]['lat']
-        y0 = points[i-1]['lon']
-        x1 = points[i]['lat']
-        y1 = points[i]['lon']
-        x2 = points[i+1]['lat']
-        y2 = points[i+1]['lon']
+import igc
+
+version = 1
+
+# Turn detector, fed one fix at a time
+class Turns:
+    def __init__(self):
+        self.left_turns = 0
+        self.right_turns = 0
+        self.left_angle = 0
+        self.right_angle = 0
+
+        self.fixes = 0
+        # time of the fix at which each full turn was completed
+        self.turn_times = []
+        self.time = None
+        # the last (up to) three points that moved
+        self.points = []
+
+        self.dir = 0
+        self.max_dir = 0
+        self.min_dir = 0
+
+    def add(self, lat, lon, time = None):
+        self.fixes += 1
+        self.time = time
+        if self.points and (self.points[-1][0] - lat)**2 + (self.points[-1][1] - lon)**2 <= 1e-8:
+            return
+        self.points.append((lat, lon))
+        if len(self.points) == 3:
+            self.turn()
+            del self.points[0]
+
+    def turn(self):
+        ((x0, y0), (x1, y1), (x2, y2)) = self.points
 
         alpha = math.atan2(y1-y0, x1-x0) - math.atan2(y2-y1, x2-x1)
         if   alpha > math.pi:   alpha -= 2 * math.pi
         elif alpha <= -math.pi: alpha += 2 * math.pi
         #print ((x0,y0), (x1,y1), (x2,y2), alpha * 180/math.pi)
-        dir += alpha
+        self.dir += alpha
 
-        max_dir = max(dir, max_dir)
-        min_dir = min(dir, min_dir)
+        self.max_dir = max(self.dir, self.max_dir)
+        self.min_dir = min(self.dir, self.min_dir)
 
-        if dir - min_dir > 2*math.pi:
-            left_turns += 1
-            dir     -= 2*math.pi
-            max_dir = dir
-        elif max_dir - dir > 2*math.pi:
-            right_turns += 1
-            dir     += 2*math.pi
-            min_dir = dir
+        if self.dir - self.min_dir > 2*math.pi:
+            self.left_turns += 1
+            self.dir     -= 2*math.pi
+            self.max_dir = self.dir
+            self.turn_times.append(self.time)
+        elif self.max_dir - self.dir > 2*math.pi:
+            self.right_turns += 1
+            self.dir     += 2*math.pi
+            self.min_dir = self.dir
+            self.turn_times.append(self.time)
 
-        if alpha > 0: left_angle  += alpha
-        else:         right_angle += -alpha
+        if alpha > 0: self.left_angle  += alpha
+        else:         self.right_angle += -alpha
 
         #assert max_dir < 2*math.pi
         #assert min_dir > - 2*math.pi
 
         #print(dir/(2*math.pi))
 
-    return {'left_turns': left_turns, 'right_turns': right_turns}
+    def result(self):
+        if self.fixes < 3:
+            return {'left_turns': 0, 'right_turns': 0}
+        return {'left_turns': self.left_turns, 'right_turns': self.right_turns}
+
+def turns(track):
+    t = Turns()
+    for (lat, lon) in zip(igc.column(track, 'lat').tolist(), igc.column(track, 'lon').tolist()):
+        t.add(lat, lon)
+    return t.result()
@@ -0,0 +1,104 @@
+# Kurbelpartner: pilots who circled in the same thermal at the same time
+#
+# Per flight, the circling phases are recorded as time intervals (from the
+# turn detector in kreise). Per day, the circling fixes of all flights are put
+# into buckets of partner_time seconds and partner_distance metres, and only
+# fixes in the same or neighbouring buckets are compared.
+
+import hashlib
+import numpy as np
+
+from constants import schaui
+import kreise
+import simplify
+import trackcache
+
+# a full turn takes at most this many seconds, the fixes before a completed
+# turn count as circling
+circle_time = 40
+
+# max distance in metres and time difference in seconds of two circling fixes
+partner_distance = 100
+partner_time = 30
+
+# kurbelzeiten come from the turns of kreise, so its version is part of this one
+version = f"1 {kreise.version} {circle_time} {partner_distance} {partner_time}"
+
+def kurbelzeiten(turn_times):
+    # merged circling intervals [start, end] in seconds of the day
+    intervals = []
+    for t in turn_times:
+        if intervals and t - circle_time <= intervals[-1][1]:
+            intervals[-1][1] = t
+        else:
+            intervals.append([t - circle_time, t])
+    return intervals
+
+def circling(track, intervals):
+    # the circling fixes of a track as arrays (time, x, y), x and y in metres from schaui
+    time = np.asarray(track['time'])
+    mask = np.zeros(len(time), dtype=bool)
+    for (start, end) in intervals:
+        mask[np.searchsorted(time, start):np.searchsorted(time, end, side='right')] = True
+    (x, y) = simplify.project(np.asarray(track['lat'])[mask], np.asarray(track['lon'])[mask], schaui)
+    return (time[mask], x, y)
+
+def digest(flights, hashes):
+    # changes when the flights of the day or their tracks change
+    return hashlib.sha256(" ".join([str(version)] + sorted(
+        f"{flight['IDFlight']}:{hashes[flight['IDFlight']]}" for flight in flights)).encode()).hexdigest()
+
+def partners(flights, all_stats, hashes = {}):
+    # for the flights of one day, the partner flights of each flight;
+    # hashes are the digests of their files, where known
+    ts = []
+    xs = []
+    ys = []
+    fs = []
+    for n, flight in enumerate(flights):
+        intervals = all_stats[str(flight['IDFlight'])]['kurbelzeiten']
+        if not intervals:
+            continue
+        (t, x, y) = circling(trackcache.load(f"_flights/{flight['IDFlight']}.igc.gz",
+            hashes.get(flight['IDFlight'])), intervals)
+        ts.append(t)
+        xs.append(x)
+        ys.append(y)
+        fs.append(np.full(len(t), n))
+    result = { flight['IDFlight']: set() for flight in flights }
+    if not ts:
+        return { id: [] for id in result }
+    t = np.concatenate(ts)
+    x = np.concatenate(xs)
+    y = np.concatenate(ys)
+    f = np.concatenate(fs)
+    pilot = np.array([ str(flight['FKPilot']) for flight in flights ])
+
+    # bucket the fixes
+    bt = t // partner_time
+    bx = np.floor(x / partner_distance).astype(np.int64)
+    by = np.floor(y / partner_distance).astype(np.int64)
+    buckets = {}
+    for (key, i) in zip(zip(bt.tolist(), bx.tolist(), by.tolist()), range(len(t))):
+        buckets.setdefault(key, []).append(i)
+    buckets = { key: np.array(ix) for key, ix in buckets.items() }
+
+    neighbours = [ (dt, dx, dy) for dt in (-1, 0, 1) for dx in (-1, 0, 1) for dy in (-1, 0, 1) ]
+    for (kt, kx, ky), a in buckets.items():
+        fa = set(f[a].tolist())
+        for (dt, dx, dy) in neighbours:
+            b = buckets.get((kt + dt, kx + dx, ky + dy))
+            if b is None:
+                continue
+            # only look at flights of other pilots that are not known partners yet
+            if all(pilot[i] == pilot[j] or flights[j]['IDFlight'] in result[flights[i]['IDFlight']]
+                   for i in fa for j in set(f[b].tolist())):
+                continue
+            close = (np.abs(t[a][:,None] - t[b][None,:]) <= partner_time) & \
+                (np.hypot(x[a][:,None] - x[b][None,:], y[a][:,None] - y[b][None,:]) <= partner_distance)
+            (ia, ib) = np.nonzero(close)
+            for (i, j) in zip(f[a][ia].tolist(), f[b][ib].tolist()):
+                if pilot[i] != pilot[j]:
+                    result[flights[i]['IDFlight']].add(flights[j]['IDFlight'])
+                    result[flights[j]['IDFlight']].add(flights[i]['IDFlight'])
+    return { id: sorted(p) for id, p in result.items() }
@@ -1,24 +1,47 @@
 import constants
+import numpy as np
 from geographiclib.geodesic import Geodesic
 
+import igc
+
 window_size = 5
+# speed in m/s below which we consider the pilot landed
+max_speed = 1
+# number of fixes at the end of the track to look at
+tail = 420
+
+# results depend on the target landing point and the detection parameters
+version = f"1 {constants.landepunkt} {window_size} {max_speed} {tail}"
 
 def roundcoord(c):
-    return (round(c['lat'], 6), round(c['lon'],6))
-
-def landepunkt(ps):
-
-    # first time in the last track points where speed is less than 1m/s
-    for i in range(max(0,len(ps)-420), len(ps)-window_size):
-        # average over n samples
-        window = ps[i:i+window_size]
-        ds = sum([
-          Geodesic.WGS84.Inverse(window[i]['lat'], window[i]['lon'],
-            window[i+1]['lat'], window[i+1]['lon'])['s12'] for i in range(len(window)-1) ])
-        dt = window[-1]['time'] - window[0]['time']
-        v = ds/dt
-        if abs(v) < 1:
-            return roundcoord(ps[i])
+    return (round(float(c['lat']), 6), round(float(c['lon']),6))
+
+def landepunkt(ps, window_size=window_size, max_speed=max_speed):
+
+    # first time in the last track points where speed is less than max_speed
+    start = max(0,len(ps)-tail)
+    end = len(ps)-window_size
+    if start < end:
+        lat = igc.column(ps[start:], 'lat').tolist()
+        lon = igc.column(ps[start:], 'lon').tolist()
+        time = igc.column(ps[start:], 'time')
+
+        # each segment distance once, windows share them
+        n = end - start
+        segment = np.array([
+          Geodesic.WGS84.Inverse(lat[i], lon[i], lat[i+1], lon[i+1])['s12']
+          for i in range(n + window_size - 2) ])
+
+        # average over window_size samples (summed in the same order as a plain sum)
+        ds = np.zeros(n)
+        for k in range(window_size-1):
+            ds += segment[k:k+n]
+        dt = time[window_size-1:window_size-1+n] - time[:n]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            v = ds/dt
+        stopped = np.flatnonzero(np.abs(v) < max_speed)
+        if len(stopped) > 0:
+            return roundcoord(ps[start + stopped[0]])
 
     return roundcoord(ps[-1])
 
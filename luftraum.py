@@ -0,0 +1,124 @@
+# Airspace intrusions: which airspaces of an OpenAir file a flight entered
+#
+# The airspaces are indexed as zones (see zonen.py) together with their floor
+# and ceiling. A fix is inside an airspace if it is inside its outline and its
+# GNSS altitude is between floor and ceiling. There is no terrain model: AGL
+# limits are taken relative to the takeoff altitude of the flight, a GND floor
+# is no limit at all, and flight levels are compared with GNSS altitude.
+# Airspaces that cannot be read are skipped, see load(). luftraum.txt is
+# fetched by fetch-luftraum.sh.
+
+import functools
+import hashlib
+import os
+import numpy as np
+import shapely
+
+import openair
+import zonen
+
+luftraum_file = "luftraum.txt"
+
+# only these classes count as intrusions
+classes = {'A', 'B', 'C', 'D', 'CTR', 'R', 'P', 'Q', 'TMZ', 'RMZ'}
+
+# the takeoff altitude is the median of this many fixes at the start
+takeoff_fixes = 10
+
+def digest():
+    if not os.path.exists(luftraum_file):
+        return None
+    with open(luftraum_file, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+# results depend on the airspace file
+version = f"2 {digest()} {takeoff_fixes} {' '.join(sorted(classes))}"
+
+def limit(s):
+    # (metres, whether relative to the ground)
+    (metres, reference) = openair.altitude(s)
+    return (metres, reference == 'AGL')
+
+def read(a):
+    # (polygon, floor, ceiling) of an airspace, ValueError if it cannot be used
+    if 'error' in a:
+        raise ValueError(a['error'])
+    if len(a['points']) < 3:
+        raise ValueError(f"{len(a['points'])} points")
+    polygon = shapely.Polygon([ (lon, lat) for (lat, lon) in a['points'] ])
+    return (polygon, limit(a['floor']), limit(a['ceiling']))
+
+@functools.cache
+def load():
+    # (names and (polygon, floor, ceiling) of the airspaces that count,
+    # names and errors of those skipped because they could not be read)
+    (names, spaces, skipped) = ([], [], [])
+    if os.path.exists(luftraum_file):
+        with open(luftraum_file, encoding='utf-8', errors='replace') as f:
+            for a in openair.parse(f.read()):
+                if a['class'].upper() not in classes:
+                    continue
+                name = f"{a['class']} {a['name']}"
+                try:
+                    spaces.append(read(a))
+                    names.append(name)
+                except ValueError as e:
+                    skipped.append((name, str(e)))
+    return (names, spaces, skipped)
+
+@functools.cache
+def airspaces():
+    # (zones, floors, ceilings) of the airspaces that count, limits as
+    # (metres, whether AGL) arrays
+    (names, spaces, _) = load()
+    zones = zonen.Zonen(names, [ polygon for (polygon, _, _) in spaces ])
+    def limits(pairs):
+        return (np.array([ m for (m, _) in pairs ], dtype='f8'), np.array([ agl for (_, agl) in pairs ], dtype=bool))
+    (floors, ceilings) = (limits([ f for (_, f, _) in spaces ]), limits([ c for (_, _, c) in spaces ]))
+    # a GND floor includes everything below the takeoff, too
+    gnd = floors[1] & (floors[0] == 0)
+    floors[0][gnd] = -np.inf
+    floors[1][gnd] = False
+    return (zones, floors, ceilings)
+
+def above_ground(limits, ground):
+    # the limits in metres above sea level
+    (metres, agl) = limits
+    return np.where(agl, metres + ground, metres)
+
+class Intrusions:
+    # fed with chunks of a track
+    def __init__(self):
+        # per airspace index: [first time, last time, fixes, highest altitude]
+        self.seen = {}
+        # takeoff altitude, from the first chunk
+        self.ground = None
+
+    def add(self, track):
+        (zones, floors, ceilings) = airspaces()
+        if len(zones) == 0 or len(track) == 0:
+            return
+        if self.ground is None:
+            self.ground = float(np.median(track['alt'][:takeoff_fixes]))
+        floor = above_ground(floors, self.ground)
+        ceiling = above_ground(ceilings, self.ground)
+        (fix, zone) = zones.hits(track['lat'], track['lon'])
+        alt = track['alt'][fix]
+        inside = (alt >= floor[zone]) & (alt <= ceiling[zone])
+        (fix, zone) = (fix[inside], zone[inside])
+        time = track['time'][fix]
+        for z in np.unique(zone).tolist():
+            at = zone == z
+            (t0, t1) = (int(time[at].min()), int(time[at].max()))
+            (n, top) = (int(at.sum()), int(track['alt'][fix[at]].max()))
+            if z in self.seen:
+                s = self.seen[z]
+                self.seen[z] = [min(s[0], t0), max(s[1], t1), s[2] + n, max(s[3], top)]
+            else:
+                self.seen[z] = [t0, t1, n, top]
+
+    def result(self):
+        (zones, _, _) = airspaces()
+        return { 'luftraum': [
+            { 'name': zones.names[z], 'von': t0, 'bis': t1, 'fixes': n, 'max_alt': top }
+            for z, (t0, t1, n, top) in sorted(self.seen.items(), key = lambda s: s[1][0]) ] }
@@ -5,8 +5,12 @@ set -e
 
 ./prepare.sh
 ./fetch-flights.sh
-./fetch-igc.sh
+./fetch-igc.py
+./update-hikes.py
 ./update-flightstats.py
 
+./density-tiles.py
 ./sektoren-map.py
-./website.py
+./trackcache.py prune
+./website.py --incremental
+./precompress.py
@@ -0,0 +1,117 @@
+# Reading OpenAir airspace files
+#
+# An airspace starts with an AC record; AN, AL and AH give its name and
+# vertical limits. Its outline is made of DP points, DC circles and DA/DB arcs
+# around the centre set by V X=, with V D= for the direction of the arcs.
+# Circles and arcs are turned into points, so every airspace is a polygon.
+# A record that cannot be read marks its airspace with an error, the other
+# airspaces of the file are still read.
+
+import math
+import re
+from geographiclib.geodesic import Geodesic
+
+# degrees between the points of circles and arcs
+arc_step = 2
+
+metres_per_nm = 1852
+metres_per_ft = 0.3048
+
+coord_re = re.compile(r'''
+    (\d+):(\d+(?:\.\d+)?)(?::(\d+(?:\.\d+)?))? \s* ([NS]) \s*,?\s*
+    (\d+):(\d+(?:\.\d+)?)(?::(\d+(?:\.\d+)?))? \s* ([EW])''', re.VERBOSE | re.IGNORECASE)
+
+altitude_re = re.compile(r'^(FL)?\s*(\d+(?:\.\d+)?)?\s*(FT|F|M)?\s*(AMSL|MSL|AGL|AGND|GND|SFC|STD)?$', re.IGNORECASE)
+
+def coord(s):
+    # (lat, lon) of an OpenAir coordinate like 47:54:51 N 07:53:21 E
+    m = coord_re.search(s)
+    if not m:
+        raise ValueError(f"Not an OpenAir coordinate: {s}")
+    def degrees(d, m, s, hemisphere, negative):
+        value = int(d) + float(m) / 60 + float(s or 0) / 3600
+        return -value if hemisphere.upper() == negative else value
+    return (degrees(*m.group(1, 2, 3, 4), 'S'), degrees(*m.group(5, 6, 7, 8), 'W'))
+
+def altitude(s):
+    # (metres, reference) of a vertical limit, reference is 'MSL', 'AGL' or 'FL';
+    # a flight level is 100 ft of pressure altitude
+    s = s.strip().upper()
+    if s in ('', 'GND', 'SFC', 'AGL'):
+        return (0.0, 'AGL')
+    if s.startswith('UNL'):
+        return (math.inf, 'MSL')
+    m = altitude_re.match(s)
+    if not m or (m.group(1) is None and m.group(2) is None):
+        raise ValueError(f"Not an OpenAir altitude: {s}")
+    (fl, value, unit, reference) = m.groups()
+    value = float(value or 0)
+    if fl:
+        return (value * 100 * metres_per_ft, 'FL')
+    metres = value if unit == 'M' else value * metres_per_ft
+    if reference in ('AGL', 'AGND', 'GND', 'SFC'):
+        return (metres, 'AGL')
+    return (metres, 'MSL')
+
+def arc(centre, radius, start, end, clockwise):
+    # points from bearing start to end, radius in metres, both ends included
+    sweep = (end - start) % 360 if clockwise else -((start - end) % 360)
+    if sweep == 0:
+        sweep = 360 if clockwise else -360
+    n = max(1, math.ceil(abs(sweep) / arc_step))
+    points = []
+    for i in range(n + 1):
+        g = Geodesic.WGS84.Direct(centre[0], centre[1], start + sweep * i / n, radius)
+        points.append((g['lat2'], g['lon2']))
+    return points
+
+def parse(text):
+    # list of airspaces, as dicts with class, name, floor, ceiling and points,
+    # and error if one of its records could not be read
+    airspaces = []
+    airspace = None
+    centre = None
+    clockwise = True
+    for line in text.splitlines():
+        line = line.split('*', 1)[0].strip()
+        if not line:
+            continue
+        (record, _, value) = line.partition(' ')
+        record = record.upper()
+        value = value.strip()
+        if record == 'AC':
+            airspace = {'class': value, 'name': '', 'floor': '', 'ceiling': '', 'points': []}
+            airspaces.append(airspace)
+            clockwise = True
+            continue
+        if airspace is None or 'error' in airspace:
+            continue
+        try:
+            if record == 'AN':
+                airspace['name'] = value
+            elif record == 'AL':
+                airspace['floor'] = value
+            elif record == 'AH':
+                airspace['ceiling'] = value
+            elif record == 'DP':
+                airspace['points'].append(coord(value))
+            elif record == 'V':
+                (name, _, v) = value.partition('=')
+                if name.strip().upper() == 'X':
+                    centre = coord(v)
+                elif name.strip().upper() == 'D':
+                    clockwise = v.strip() != '-'
+            elif record == 'DC':
+                airspace['points'] += arc(centre, float(value) * metres_per_nm, 0, 360, True)[:-1]
+            elif record == 'DA':
+                (radius, start, end) = [ float(v) for v in value.split(',') ]
+                airspace['points'] += arc(centre, radius * metres_per_nm, start, end, clockwise)
+            elif record == 'DB':
+                (p1, p2) = [ coord(m.group(0)) for m in coord_re.finditer(value) ][:2]
+                g1 = Geodesic.WGS84.Inverse(centre[0], centre[1], p1[0], p1[1])
+                g2 = Geodesic.WGS84.Inverse(centre[0], centre[1], p2[0], p2[1])
+                airspace['points'] += arc(centre, g1['s12'], g1['azi1'], g2['azi1'], clockwise)
+        except (ValueError, TypeError) as e:
+            # TypeError for an arc or circle without a V X= centre
+            airspace['error'] = f"{line}: {e}"
+    return airspaces
@@ -0,0 +1,45 @@
+# Polar cells of a track: distance and azimuth of every fix from schaui,
+# quantized and deduplicated, so that the sectors of any other ring layout can
+# be computed without looking at the track again.
+#
+# A cell is stored as one uint32, distance step << 16 | azimuth step.
+
+import numpy as np
+
+import sektoren
+from constants import schaui
+
+# size of a cell, in km and degrees; at the outer ring 0.1° is about 50 m
+dist_step = 0.02
+azi_step = 0.1
+
+# results depend on the quantization
+version = f"1 {schaui} {dist_step} {azi_step}"
+
+azi_steps = round(360 / azi_step)
+
+def cells(lat, lon):
+    # sorted distinct cells of the fixes
+    (d, phi) = sektoren.polar(np.asarray(lat, dtype='f8'), np.asarray(lon, dtype='f8'))
+    dq = np.minimum(np.rint(d / dist_step), 0xffff).astype(np.uint32)
+    aq = np.rint(phi / azi_step).astype(np.int64) % azi_steps
+    return np.unique(dq << 16 | aq.astype(np.uint32))
+
+def polar(cells):
+    # (distance, azimuth) of the cell centres
+    return ((cells >> 16) * dist_step, (cells & 0xffff) * azi_step)
+
+def sektoren_of_cells(cells, layout):
+    # names of the sectors of a ring layout (from constants.layout) the cells are in
+    (radius, segments, offset) = layout
+    rings = len(radius)
+    ring_segments = np.array([1] + segments)
+    ring_offset = np.array([0] + offset)
+
+    (d, phi) = polar(cells)
+    ring = np.searchsorted(radius, d, side='right')
+    inside = ring < rings
+    ring = ring[inside]
+    s = ring_segments[ring]
+    si = np.floor((360 + (phi[inside] - ring_offset[ring])) / (360 / s)).astype(int) % s
+    return sorted({ sektoren.sektorname(isi) for isi in set(zip(ring.tolist(), si.tolist())) })
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+# Writes gzip and brotli siblings (.gz, .br) of the text files in _out/, so
+# that they can be served precompressed. A sibling is only recompressed when
+# it is older than its file. Without the brotli module only gzip is written.
+
+import argparse
+import gzip
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import timings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+out_dir = "_out"
+suffixes = ('.html', '.json', '.txt', '.css', '.js', '.svg')
+
+def compressors():
+    yield ('.gz', lambda data: gzip.compress(data, 9, mtime=0))
+    if brotli:
+        yield ('.br', lambda data: brotli.compress(data, quality=11))
+
+def outdated(path):
+    # siblings that are missing or older than the file
+    mtime = os.stat(path).st_mtime_ns
+    return [ suffix for (suffix, _) in compressors()
+        if not os.path.exists(path + suffix) or os.stat(path + suffix).st_mtime_ns < mtime ]
+
+def compress(path, which):
+    # (path, bytes before, bytes after per sibling)
+    with open(path, 'rb') as f:
+        data = f.read()
+    sizes = {}
+    for (suffix, compressor) in compressors():
+        if suffix in which:
+            packed = compressor(data)
+            tmp = f"{path}{suffix}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(packed)
+            os.replace(tmp, path + suffix)
+            sizes[suffix] = len(packed)
+    return (path, len(data), sizes)
+
+def files(directory):
+    # the timings change after this ran, and are not worth compressing
+    for (dirpath, _, filenames) in os.walk(directory):
+        for filename in filenames:
+            path = f"{dirpath}/{filename}"
+            if filename.endswith(suffixes) and path != timings.timings_file:
+                yield path
+
+def remove_orphans(directory):
+    # siblings whose file is gone
+    removed = 0
+    for (dirpath, _, filenames) in os.walk(directory):
+        for filename in filenames:
+            (base, suffix) = os.path.splitext(filename)
+            if suffix in ('.gz', '.br') and base.endswith(suffixes) and \
+                (base not in filenames or f"{dirpath}/{base}" == timings.timings_file):
+                os.remove(f"{dirpath}/{filename}")
+                removed += 1
+    return removed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write precompressed siblings of the website files')
+    parser.add_argument('-j', '--jobs', type=int, default=len(os.sched_getaffinity(0)),
+        help='Number of worker processes (default: number of available cores)')
+    args = parser.parse_args()
+
+    if not brotli:
+        print("No brotli module, only writing .gz files")
+
+    with timings.stage('precompress') as stage:
+        todo = [ (path, which) for path in files(out_dir) for which in [outdated(path)] if which ]
+        stage.count('files', len(todo))
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            futures = [ executor.submit(compress, path, which) for (path, which) in todo ]
+            for future in as_completed(futures):
+                (path, size, sizes) = future.result()
+                stage.count('bytes', size)
+                for suffix, packed in sizes.items():
+                    stage.count(f'bytes{suffix}', packed)
+        removed = remove_orphans(out_dir)
+        stage.count('removed', removed)
+        print(f"Precompressed {len(todo)} files, removed {removed} orphaned siblings")
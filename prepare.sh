@@ -6,5 +6,6 @@ mkdir -p _out
 ./sektoren-geojson.py > sektoren.json
 ./sektoren-airspace.py > sektoren-airspace.txt
 cp sektoren.json sektoren-airspace.txt _out
+./fetch-luftraum.sh
 
 ./login.sh
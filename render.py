@@ -0,0 +1,42 @@
+# Rendering of the website templates
+#
+# Compiled templates are kept in a bytecode cache in _tmp/, and pages are only
+# written when their contents changed, so that unchanged files keep their
+# modification time.
+
+import functools
+import os
+import time
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+
+bytecode_dir = "_tmp/jinja"
+
+@functools.cache
+def environment():
+    os.makedirs(bytecode_dir, exist_ok=True)
+    return Environment(
+        loader=FileSystemLoader("templates"),
+        autoescape=select_autoescape(),
+        bytecode_cache=FileSystemBytecodeCache(bytecode_dir),
+    )
+
+def write_if_changed(filename, data):
+    # whether the file was written
+    try:
+        with open(filename, 'rb') as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    tmp = f"{filename}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, filename)
+    return True
+
+def render(template, data, filename):
+    # (filename, written, seconds)
+    start = time.perf_counter()
+    text = environment().get_template(template).render(data)
+    written = write_if_changed(filename, text.encode('utf-8'))
+    return (filename, written, time.perf_counter() - start)
@@ -0,0 +1,137 @@
+# Scoring of the season, computed on one table of all flights
+#
+# flights() builds the table, one row per flight, sorted by pilot and start
+# time; everything else is grouped operations on it.
+
+import numpy as np
+import pandas as pd
+
+# extra points, by pilot
+sonderwertung = {
+    # '10564': 1,
+    # '14869': 3,
+    # '12218': 2,
+    # '771': 1,
+    '14475': 1,
+    '14679': 1,
+}
+
+# pilots need this many turns to show up in the turn statistics
+min_turns = 100
+
+def full_name(f):
+    return f['FirstName'] + ' ' + f['LastName']
+
+def hikes(flight_data, hike_authors):
+    # ids of hike & fly flights: from Schauinsland, and the pilot said so
+    return { f['IDFlight'] for f in flight_data
+        if f['TakeoffWaypointName'] == "Schauinsland"
+        and str(f['FKPilot']) in hike_authors.get(str(f['IDFlight']), ()) }
+
+def flights(flight_data, all_stats, hikes = ()):
+    # table of all flights; hikes are the ids of hike & fly flights, all_stats
+    # is keyed by str ids like the stats store
+    table = pd.DataFrame({
+        'id':          [ f['IDFlight'] for f in flight_data ],
+        'pid':         [ str(f['FKPilot']) for f in flight_data ],
+        'name':        [ full_name(f) for f in flight_data ],
+        'date':        [ f['FlightDate'] for f in flight_data ],
+        'start':       [ f['FlightStartTime'] for f in flight_data ],
+        'takeoff':     [ f['TakeoffWaypointName'] for f in flight_data ],
+        'duration':    [ int(f['FlightDuration']) for f in flight_data ],
+        'fotos':       [ int(f['HasPhotos']) > 0 for f in flight_data ],
+        'left_turns':  [ all_stats[str(f['IDFlight'])]['left_turns'] for f in flight_data ],
+        'right_turns': [ all_stats[str(f['IDFlight'])]['right_turns'] for f in flight_data ],
+        'sektoren':    [ all_stats[str(f['IDFlight'])]['sektoren'] for f in flight_data ],
+        'kurbelpartner': [ all_stats[str(f['IDFlight'])].get('kurbelpartner', []) for f in flight_data ],
+    }, columns = ['id', 'pid', 'name', 'date', 'start', 'takeoff', 'duration', 'fotos',
+                  'left_turns', 'right_turns', 'sektoren', 'kurbelpartner'])
+    table['hike'] = table['id'].isin(list(hikes))
+
+    # pilots in order of their first flight in flight_data, their flights by time
+    table['pilot'] = pd.factorize(table['pid'])[0]
+    table = table.sort_values(['pilot', 'start'], kind = 'stable', ignore_index = True)
+    table['n'] = table.groupby('pilot').cumcount() + 1
+    return table
+
+def new_sektoren(table):
+    # (pilot, flight, sektor) of the sectors a pilot reached first on that flight
+    sektoren = table[['pilot', 'sektoren']].explode('sektoren').dropna()
+    sektoren = pd.DataFrame({
+        'pilot': sektoren['pilot'].to_numpy(),
+        'flight': sektoren.index.to_numpy(),
+        'sektor': sektoren['sektoren'].to_numpy(),
+    })
+    return sektoren[~ sektoren.duplicated(['pilot', 'sektor'])]
+
+def pilot_stats(table, new = None):
+    # per pilot sums, indexed by pid, in the order of table
+    if new is None:
+        new = new_sektoren(table)
+    pilots = table.groupby('pilot', sort = True)
+    stats = pd.DataFrame({
+        'schauiflights': (table['takeoff'] == "Schauinsland").groupby(table['pilot']).sum(),
+        'lindenflights': (table['takeoff'] == "Lindenberg").groupby(table['pilot']).sum(),
+        'flighttime':    pilots['duration'].sum(),
+        'hikes':         pilots['hike'].sum(),
+        'fotos':         pilots['fotos'].sum(),
+        'sektoren':      new.groupby('pilot').size().reindex(pilots.size().index, fill_value = 0),
+        'left_turns':    pilots['left_turns'].sum(),
+        'right_turns':   pilots['right_turns'].sum(),
+    })
+    stats.index = pilots['pid'].first().to_numpy()
+    stats['name'] = pilots['name'].first().to_numpy()
+
+    diff = stats['left_turns'] - stats['right_turns']
+    stats['drehrichtung'] = np.select([diff > 0, diff < 0], ["(nach links)", "(nach rechts)"], "")
+    stats['drehueberschuss'] = diff.abs()
+    stats['sonderwertung'] = stats.index.map(lambda pid: sonderwertung.get(pid, 0)).astype(int)
+    return stats
+
+def points_of_stats(stats):
+    points = pd.DataFrame({
+        'schauiflights':   stats['schauiflights']   * 5,
+        'lindenflights':   stats['lindenflights']   * 5,
+        'flighttime':      stats['flighttime']      // 60,
+        'hikes':           stats['hikes']           * 120,
+        'fotos':           stats['fotos']           * 3,
+        'sektoren':        stats['sektoren']        * 23,
+        #'landepunkt1':     stats['landepunkt1']     * 100,
+        #'landepunkt2':     stats['landepunkt2']     * 25,
+        #'landepunkt3':     stats['landepunkt3']     * 5,
+        'drehueberschuss': stats['drehueberschuss'] * -1,
+        'sonderwertung':   stats['sonderwertung']   * 400,
+    }, index = stats.index)
+    points['total'] = points.sum(axis = 1)
+    return points
+
+def relative_points(points, old_points):
+    # points relative to last year's total, NaN for pilots without one
+    old = points.index.map(lambda pid: old_points.get(pid, np.nan)).astype(float)
+    return points['total'] / old
+
+def ranking(points, key = 'total'):
+    # pids, best first; ties keep the order of points
+    return points.sort_values(key, ascending = False, kind = 'stable').index
+
+def turn_stats(stats):
+    # (name, pid, value) of the most and least balanced pilots, stats in ranking order;
+    # None if no pilot has more than min_turns turns
+    turns = stats[stats['left_turns'] + stats['right_turns'] > min_turns]
+    if turns.empty:
+        return None
+    total = turns['left_turns'] + turns['right_turns']
+    left = turns['left_turns'] - turns['right_turns']
+    right = turns['right_turns'] - turns['left_turns']
+
+    def pick(values, best):
+        pid = values.idxmin() if best == 'min' else values.idxmax()
+        return (turns.at[pid, 'name'], pid, values[pid].item())
+
+    return {
+        'least_rel_diff':     pick(100 * left.abs() / total, 'min'),
+        'max_rel_diff_left':  pick(100 * left / total, 'max'),
+        'max_abs_diff_left':  pick(left, 'max'),
+        'max_rel_diff_right': pick(100 * right / total, 'max'),
+        'max_abs_diff_right': pick(right, 'max'),
+    }
@@ -5,18 +5,27 @@ import pandas as pd
 import folium
 import math
 import sys
-import subprocess
 import igc
 import json
 import os
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 import constants
 from constants import *
 import sektoren
 import landepunkt
+import trackcache
+import statsdb
+import simplify
+import density
+import timings
 
+# Tolerance in metres when simplifying tracks for the maps
+track_tolerance = 3
 
-def write_map(outfile, flights, all=False, show_tracks=True):
+def write_map(outfile, flights, all_stats, hashes, all=False, show_tracks=True):
     print(f"Writing {outfile}")
 
     # Read flights
@@ -29,16 +38,16 @@ def write_map(outfile, flights, all=False, show_tracks=True):
         pid = flight['FKPilot']
 
         # Track
-        if show_tracks:
-            gunzip = subprocess.Popen(('gunzip',), stdin=open(f'_flights/{id}.igc.gz'), stdout=subprocess.PIPE)
-            track = igc.parse(gunzip.stdout)
-            if all:
-                # reduce track complexity when showing all flights
-                track = track[::5]
-            tracks += [ [(round(p['lat'],5), round(p['lon'],5)) for p in track ] ]
+        # (all tracks are drawn from the density tiles)
+        if show_tracks and not all:
+            track = trackcache.load(f'_flights/{id}.igc.gz', hashes.get(id))
+            # reduce track complexity
+            keep = simplify.simplify(track['lat'], track['lon'], track_tolerance)
+            tracks += [ [(round(lat,5), round(lon,5)) for (lat, lon) in
+                zip(track['lat'][keep].tolist(), track['lon'][keep].tolist()) ] ]
 
         # Remember landepunkte and segments
-        stats = json.load(open(f'_stats/{id}.stats.json'))
+        stats = all_stats[str(id)]
         for sektor in stats['sektoren']:
             if sektor not in sektor_piloten:
                 sektor_piloten[sektor] = set()
@@ -68,7 +77,7 @@ def write_map(outfile, flights, all=False, show_tracks=True):
 
     if all:
         folium.features.Choropleth(
-            geo_data = "sektoren.json",
+            geo_data = sektoren.geojson(),
             key_on = 'feature.id',
             columns = ['sektor', 'pilots'],
             data = pd.DataFrame({'sektor': sektor_piloten.keys(), 'pilots': [len(s) for s in sektor_piloten.values()]}),
@@ -86,7 +95,7 @@ def write_map(outfile, flights, all=False, show_tracks=True):
             else:
                 return {'fill': False, 'stroke': False}
         folium.features.GeoJson(
-        data = "sektoren.json",
+        data = sektoren.geojson(),
         style_function = style_function,
         overlay = False,
         ).add_to(sektoren_layer)
@@ -98,7 +107,16 @@ def write_map(outfile, flights, all=False, show_tracks=True):
             folium.Circle(radius = r, location=constants.landepunkt, color = 'green', fill=True).add_to(target_layer)
 
     # Draw tracks
-    if show_tracks:
+    if show_tracks and all:
+        folium.TileLayer(
+            tiles = 'density/{z}/{x}/{y}.png',
+            attr = 'Flugtracks',
+            min_zoom = density.min_zoom,
+            max_native_zoom = density.max_zoom,
+            name = 'Tracks',
+            overlay = True,
+        ).add_to(m)
+    elif show_tracks:
         track_layer = folium.FeatureGroup(name="Tracks").add_to(m)
         for track in tracks:
             folium.PolyLine([track], color="crimson").add_to(track_layer)
@@ -114,31 +132,91 @@ def write_map(outfile, flights, all=False, show_tracks=True):
 
     m.save(outfile)
 
-# Read flight data, grouped by pilot
-
-print("Reading _tmp/flights.json")
-flight_data = json.load(open('_tmp/flights.json'))
-
-flights = {}
-all_flights = []
-
-for flight in flight_data:
-    pid = flight['FKPilot']
-
-    if pid not in flights:
-        flights[pid] = []
-    flights[pid].append(flight)
-    all_flights.append(flight)
-
-for pid, pflights in flights.items():
-    if len(sys.argv) > 1:
-        if pid not in sys.argv[1:]:
-            continue
-
-    write_map(f"_out/map{pid}.html", pflights)
-
-if len(sys.argv) == 1 or "map" in sys.argv:
-    write_map(f"_out/map.html", all_flights, all= True, show_tracks = False)
-if len(sys.argv) == 1 or "all" in sys.argv:
-    write_map(f"_out/map_all.html", all_flights, all = True, show_tracks = True)
+# Rough memory needed to render one map, used to stay within --memory
+map_base_memory = 150 * 2**20
+fix_memory = 500
+
+def memory_estimate(flights, hashes, all=False, show_tracks=True):
+    if all or not show_tracks:
+        return map_base_memory
+    fixes = sum(len(trackcache.load(f"_flights/{flight['IDFlight']}.igc.gz", hashes[flight['IDFlight']]))
+        for flight in flights)
+    return map_base_memory + fixes * fix_memory
+
+def render(job):
+    # seconds it took to render the map
+    (outfile, flights, all_stats, hashes, kwargs) = job
+    start = time.perf_counter()
+    write_map(outfile, flights, all_stats, hashes, **kwargs)
+    return time.perf_counter() - start
+
+def render_all(jobs, workers, memory, stage):
+    # Renders the jobs in parallel, biggest first, starting a job only when the
+    # estimated memory of all running jobs stays within the budget
+    jobs = sorted(jobs, key = lambda job: - job[0])
+    running = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while jobs or running:
+            while jobs and len(running) < workers and \
+                (not running or sum(running.values()) + jobs[0][0] <= memory):
+                (estimate, job) = jobs.pop(0)
+                running[executor.submit(render, job)] = estimate
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                del running[future]
+                stage.count('maps')
+                stage.count('map seconds', future.result())
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Draws the sector maps')
+    parser.add_argument('only', nargs='*',
+        help='Only draw the maps of these pilots, and "map" or "all" for the season maps')
+    parser.add_argument('-j', '--jobs', type=int, default=len(os.sched_getaffinity(0)),
+        help='Number of worker processes (default: number of available cores)')
+    parser.add_argument('--memory', type=int, default=None,
+        help='Memory budget in MB for all workers together (default: unlimited)')
+    args = parser.parse_args()
+
+    # Read flight data, grouped by pilot
+
+    print("Reading _tmp/flights.json")
+    flight_data = json.load(open('_tmp/flights.json'))
+    all_stats = statsdb.load_all()
+
+    flights = {}
+    all_flights = []
+
+    for flight in flight_data:
+        pid = flight['FKPilot']
 
+        if pid not in flights:
+            flights[pid] = []
+        flights[pid].append(flight)
+        all_flights.append(flight)
+
+    def job(outfile, flights, **kwargs):
+        stats = { str(flight['IDFlight']): all_stats[str(flight['IDFlight'])] for flight in flights }
+        # hashed once here, the tracks are loaded again in the worker
+        hashes = {}
+        if kwargs.get('show_tracks', True) and not kwargs.get('all', False):
+            hashes = { flight['IDFlight']: trackcache.digest(f"_flights/{flight['IDFlight']}.igc.gz") for flight in flights }
+        return (memory_estimate(flights, hashes, **kwargs), (outfile, flights, stats, hashes, kwargs))
+
+    jobs = []
+    for pid, pflights in flights.items():
+        if args.only:
+            if str(pid) not in args.only:
+                continue
+
+        jobs.append(job(f"_out/map{pid}.html", pflights))
+
+    if not args.only or "map" in args.only:
+        jobs.append(job(f"_out/map.html", all_flights, all= True, show_tracks = False))
+    if not args.only or "all" in args.only:
+        jobs.append(job(f"_out/map_all.html", all_flights, all = True, show_tracks = True))
+
+    memory = math.inf if args.memory is None else args.memory * 2**20
+    # computed once here, and inherited by the workers
+    sektoren.sektoren_daten()
+    with timings.stage('sektoren-map') as stage:
+        render_all(jobs, args.jobs, memory, stage)
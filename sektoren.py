@@ -1,8 +1,18 @@
 from geographiclib.geodesic import Geodesic
+import functools
+import hashlib
+import json
 import math
+import os
+import numpy as np
+
+import igc
 
 from constants import *
 
+# results depend on the ring layout around the centre
+version = f"1 {schaui} {rings} {r0} {dr0} {drf}"
+
 def sektorname(s):
     return chr(ord('A') + s[0]) + str(s[1]+1)
 
@@ -30,12 +40,69 @@ def sektor_of_point(point):
                 si = int((360 + (phi - o)) // (360/s)) % s
                 return (i,si)
 
-def sektoren(track):
-    seen = set()
-    for point in track:
-        sektor = sektor_of_point((point['lat'],point['lon']))
+# Fast bulk lookup: Distance and azimuth from schaui are approximated on the
+# tangent plane at the mid latitude, which is accurate to a few cm and 1e-4°
+# within the rings. Fixes that are closer than the margins to a ring or
+# segment boundary are resolved with the exact geodesic.
+margin_km = 1e-3
+margin_deg = 1e-2
+
+# per ring, indexed like the result of sektor_of_point
+ring_radius = np.array(radius)
+ring_segments = np.array([1] + segments)
+ring_offset = np.array([0] + offset)
+
+def project(lat, lon):
+    # metres east and north of schaui
+    a = Geodesic.WGS84.a
+    e2 = Geodesic.WGS84.f * (2 - Geodesic.WGS84.f)
+    p0 = math.radians(schaui[0])
+    l0 = math.radians(schaui[1])
+    p = np.radians(lat)
+    dl = np.radians(lon) - l0
+    pm = (p + p0)/2
+    w = 1 - e2 * np.sin(pm)**2
+    x = a / np.sqrt(w) * np.cos(pm) * dl
+    y = a * (1 - e2) / w**1.5 * (p - p0)
+    return (x, y)
+
+def polar(lat, lon):
+    (x, y) = project(lat, lon)
+    dl = np.radians(lon) - math.radians(schaui[1])
+    pm = (np.radians(lat) + math.radians(schaui[0]))/2
+    d = np.hypot(x, y)/1000
+    phi = np.degrees(np.arctan2(x, y) - dl * np.sin(pm) / 2)
+    return (d, phi)
+
+def sektoren_of_track(lat, lon):
+    # returns ring and segment per fix, ring == rings if outside
+    lat = np.asarray(lat, dtype='f8')
+    lon = np.asarray(lon, dtype='f8')
+    d, phi = polar(lat, lon)
+
+    ring = np.searchsorted(ring_radius, d, side='right')
+    r = np.minimum(ring, rings - 1)
+    width = 360 / ring_segments[r]
+    pos = (360 + (phi - ring_offset[r])) / width
+    si = np.floor(pos).astype(int) % ring_segments[r]
+
+    frac = pos - np.floor(pos)
+    near = np.min(np.abs(d[:,None] - ring_radius[None,:]), axis=1) < margin_km
+    near |= (ring > 0) & (ring < rings) & (np.minimum(frac, 1 - frac) * width < margin_deg)
+
+    for k in np.flatnonzero(near):
+        sektor = sektor_of_point((lat[k], lon[k]))
         if sektor:
-            seen.add(sektor)
+            (ring[k], si[k]) = sektor
+        else:
+            ring[k] = rings
+    si[ring == 0] = 0
+    return (ring, si)
+
+def sektoren(track):
+    (ring, si) = sektoren_of_track(igc.column(track, 'lat'), igc.column(track, 'lon'))
+    inside = ring < rings
+    seen = set(zip(ring[inside].tolist(), si[inside].tolist()))
     return sorted(list(seen))
 
 
@@ -62,9 +129,34 @@ def midpoint(s):
         assert (sektor_of_point(p) == s)
         return p
 
+# points per sector edge of the polygons
+smoothness = 2
+
+# the polygons only depend on the ring layout, and are computed once per layout
+geometry_dir = "_tmp"
+
+def geometry_file():
+    key = repr((schaui, radius, segments, offset, smoothness))
+    return f"{geometry_dir}/sektoren-{hashlib.sha256(key.encode()).hexdigest()[:16]}.json"
+
+@functools.cache
 def sektoren_daten():
+    # (name, points) of every sector polygon
+    path = geometry_file()
+    if os.path.exists(path):
+        with open(path) as f:
+            return [ (name, [ tuple(p) for p in ps ]) for (name, ps) in json.load(f) ]
+
+    sektoren = compute_sektoren_daten()
+    os.makedirs(geometry_dir, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(sektoren, f)
+    os.replace(tmp, path)
+    return sektoren
+
+def compute_sektoren_daten():
     sektoren = []
-    smoothness = 2
 
     for i in range(rings-1):
         if i == 0:
@@ -111,3 +203,15 @@ def geojson():
         } for (name, ps) in sektoren_daten()
       ]
     }
+
+def openair():
+    # the sectors as OpenAir airspaces
+    from pyopenair.helper import generate_coords
+
+    lines = []
+    for (name, ps) in sektoren_daten():
+        lines += [ "AC W", f"AN {name}", "AL 0", "AH UNLIM", "" ]
+        lines += [ generate_coords(lonlat(p)) for p in ps ]
+        lines += [ "" ]
+    return "\n".join(lines) + "\n"
+
@@ -0,0 +1,48 @@
+# Track simplification (Douglas–Peucker) for drawing tracks on maps
+
+import math
+import numpy as np
+
+earth_radius = 6371000
+
+def project(lat, lon, origin = None):
+    # metres on a plane tangent at origin (default: the first fix), good enough
+    # for simplification
+    (lat0, lon0) = (lat[0], lon[0]) if origin is None else origin
+    x = np.radians(lon - lon0) * math.cos(math.radians(lat0)) * earth_radius
+    y = np.radians(lat - lat0) * earth_radius
+    return (x, y)
+
+def simplify(lat, lon, tolerance):
+    # mask of the fixes to keep, so that no dropped fix is more than
+    # tolerance metres away from the simplified line
+    lat = np.asarray(lat, dtype='f8')
+    lon = np.asarray(lon, dtype='f8')
+    n = len(lat)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[0] = keep[-1] = True
+    (x, y) = project(lat, lon)
+
+    stack = [(0, n-1)]
+    while stack:
+        (i, j) = stack.pop()
+        if j <= i + 1:
+            continue
+        dx = x[j] - x[i]
+        dy = y[j] - y[i]
+        px = x[i+1:j] - x[i]
+        py = y[i+1:j] - y[i]
+        length = math.hypot(dx, dy)
+        if length > 0:
+            d = np.abs(dx * py - dy * px) / length
+        else:
+            d = np.hypot(px, py)
+        k = int(np.argmax(d))
+        if d[k] > tolerance:
+            m = i + 1 + k
+            keep[m] = True
+            stack.append((i, m))
+            stack.append((m, j))
+    return keep
@@ -0,0 +1,143 @@
+# Store of flight stats, in one SQLite file.
+#
+# Results are stored per analyzer and keyed by the hash of the IGC file, together
+# with the version of the analyzer that produced them. A flight needs to be
+# (re)analyzed only by those analyzers whose version changed. The hike & fly
+# index of the comments files is kept the same way, keyed by their hash.
+# Results that are arrays are stored as raw bytes.
+
+import json
+import os
+import sqlite3
+import numpy as np
+
+import flightstats
+import hikes
+
+db_file = "_stats/stats.sqlite"
+
+def connect():
+    os.makedirs(os.path.dirname(db_file), exist_ok=True)
+    conn = sqlite3.connect(db_file)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS flights (
+            id TEXT PRIMARY KEY,
+            hash TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS results (
+            hash TEXT NOT NULL,
+            analyzer TEXT NOT NULL,
+            version TEXT NOT NULL,
+            result TEXT NOT NULL,
+            PRIMARY KEY (hash, analyzer)
+        );
+        CREATE TABLE IF NOT EXISTS partners (
+            date TEXT PRIMARY KEY,
+            digest TEXT NOT NULL,
+            result TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS comments (
+            id TEXT PRIMARY KEY,
+            hash TEXT
+        );
+        CREATE TABLE IF NOT EXISTS hikes (
+            hash TEXT PRIMARY KEY,
+            version TEXT NOT NULL,
+            authors TEXT NOT NULL
+        );
+    """)
+    return conn
+
+def versions():
+    return { name: str(a.version) for name, a in flightstats.analyzers.items() }
+
+def missing(conn, hash):
+    # analyzers that have no current result for this IGC file
+    current = versions()
+    done = { analyzer for (analyzer, version) in
+        conn.execute("SELECT analyzer, version FROM results WHERE hash = ?", (hash,))
+        if current.get(analyzer) == version }
+    return [ name for name in current if name not in done ]
+
+def set_flights(conn, hashes):
+    # hashes of the IGC files, by flight id; ids are stored as str, so results
+    # are keyed by str(id) whatever type the API gave
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO flights (id, hash) VALUES (?, ?)",
+            [ (str(id), hash) for id, hash in hashes.items() ])
+
+def store(conn, hash, results):
+    current = versions()
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO results (hash, analyzer, version, result) VALUES (?, ?, ?, ?)",
+            [ (hash, name, current[name], encode(result)) for name, result in results.items() ])
+
+def encode(result):
+    if isinstance(result, np.ndarray):
+        return result.tobytes()
+    return json.dumps(result)
+
+def partners_digest(conn, date):
+    row = conn.execute("SELECT digest FROM partners WHERE date = ?", (date,)).fetchone()
+    return row and row[0]
+
+def store_partners(conn, date, digest, result):
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO partners (date, digest, result) VALUES (?, ?, ?)",
+            (date, digest, json.dumps(result)))
+
+def set_comments(conn, hashes):
+    # hashes of the comments files, by flight id, None for flights without one
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO comments (id, hash) VALUES (?, ?)",
+            [ (str(id), hash) for id, hash in hashes.items() ])
+
+def hikes_current(conn, hash):
+    row = conn.execute("SELECT version FROM hikes WHERE hash = ?", (hash,)).fetchone()
+    return row is not None and row[0] == str(hikes.version)
+
+def store_hikes(conn, hash, authors):
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO hikes (hash, version, authors) VALUES (?, ?, ?)",
+            (hash, str(hikes.version), json.dumps(authors)))
+
+def load_hikes(conn = None):
+    # per flight, the authors of hike & fly comments
+    if conn is None:
+        conn = connect()
+    return { id: json.loads(authors) for (id, authors) in conn.execute("""
+            SELECT comments.id, hikes.authors
+            FROM comments JOIN hikes ON comments.hash = hikes.hash
+            WHERE hikes.version = ?""", (str(hikes.version),)) }
+
+def load_all(conn = None):
+    # stats of all flights, as produced by flightstats.py
+    if conn is None:
+        conn = connect()
+    current = versions()
+    results = {}
+    for (id, analyzer, version, result) in conn.execute("""
+            SELECT flights.id, results.analyzer, results.version, results.result
+            FROM flights JOIN results ON flights.hash = results.hash
+            WHERE results.analyzer NOT IN (%s)""" % ",".join("?" * len(flightstats.array_analyzers)),
+            sorted(flightstats.array_analyzers)):
+        if current.get(analyzer) == version:
+            results.setdefault(id, {})[analyzer] = json.loads(result)
+    stats = { id: flightstats.merge(r) for id, r in results.items() }
+
+    # partner flights, from the per day results
+    for (result,) in conn.execute("SELECT result FROM partners"):
+        for id, partners in json.loads(result).items():
+            if id in stats:
+                stats[id]['kurbelpartner'] = partners
+    return stats
+
+def load_array(analyzer, dtype, conn = None):
+    # per flight, the array result of an analyzer
+    if conn is None:
+        conn = connect()
+    version = versions()[analyzer]
+    return { id: np.frombuffer(result, dtype=dtype) for (id, result) in conn.execute("""
+            SELECT flights.id, results.result
+            FROM flights JOIN results ON flights.hash = results.hash
+            WHERE results.analyzer = ? AND results.version = ?""", (analyzer, version)) }
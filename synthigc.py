@@ -0,0 +1,81 @@
+# Synthetic IGC flights around schaui, for benchmarks
+#
+# A flight alternates between thermals (circling while climbing and drifting
+# with the wind) and glides back towards the area, and ends with a few
+# minutes on the ground.
+
+import math
+import random
+
+from constants import schaui
+
+metres_per_degree = 111320
+
+def fix(t, lat, lon, alt):
+    t = int(t)
+    ns = 'N' if lat >= 0 else 'S'
+    ew = 'E' if lon >= 0 else 'W'
+    lat = round(abs(lat) * 60000)
+    lon = round(abs(lon) * 60000)
+    return (f"B{t // 3600 % 24:02d}{t // 60 % 60:02d}{t % 60:02d}"
+        f"{lat // 60000:02d}{lat % 60000:05d}{ns}"
+        f"{lon // 60000:03d}{lon % 60000:05d}{ew}"
+        f"A{max(alt - 20, 0):05d}{alt:05d}")
+
+def flight(seed, duration = 3600, rate = 1, start = 10 * 3600):
+    # IGC file contents, duration in seconds, rate in fixes per second
+    rnd = random.Random(seed)
+    lines = [
+        "AXXXSYN",
+        "HFDTE010725",
+        f"HFPLTPILOTINCHARGE:Synthetic {seed}",
+        "HFGTYGLIDERTYPE:Synthetic",
+    ]
+
+    lat = schaui[0] + rnd.uniform(-0.002, 0.002)
+    lon = schaui[1] + rnd.uniform(-0.002, 0.002)
+    alt = 1250.0
+    heading = rnd.uniform(0, 360)
+    wind = (rnd.uniform(-3, 3), rnd.uniform(-3, 3))
+    dt = 1 / rate
+
+    t = 0
+    while t < duration:
+        thermal = rnd.random() < 0.5
+        phase = rnd.uniform(60, 300) if thermal else rnd.uniform(60, 240)
+        if thermal:
+            radius = rnd.uniform(35, 60)
+            speed = 10
+            turn = rnd.choice([-1, 1]) * math.degrees(speed / radius)
+            vario = rnd.uniform(1, 3)
+        else:
+            # head back when far from schaui
+            dy = (schaui[0] - lat) * metres_per_degree
+            dx = (schaui[1] - lon) * metres_per_degree * math.cos(math.radians(lat))
+            if math.hypot(dx, dy) > 15000:
+                heading = math.degrees(math.atan2(dx, dy))
+            else:
+                heading += rnd.uniform(-60, 60)
+            speed = rnd.uniform(9, 13)
+            turn = 0
+            vario = -rnd.uniform(0.8, 1.5)
+
+        end = min(t + phase, duration)
+        while t < end:
+            heading += turn * dt
+            vx = speed * math.sin(math.radians(heading)) + wind[0]
+            vy = speed * math.cos(math.radians(heading)) + wind[1]
+            lat += vy * dt / metres_per_degree
+            lon += vx * dt / (metres_per_degree * math.cos(math.radians(lat)))
+            alt = min(max(alt + vario * dt, 300), 3000)
+            lines.append(fix(start + t, lat, lon, round(alt)))
+            t += dt
+
+    # on the ground
+    for i in range(int(300 * rate)):
+        lines.append(fix(start + t, lat, lon, round(alt)))
+        t += dt
+
+    lines.append("LXXXSYN end of flight")
+    lines.append("GSYNTHETIC")
+    return ("\r\n".join(lines) + "\r\n").encode()
@@ -0,0 +1,89 @@
+# Timings and counters of the build stages
+#
+# Every pipeline script records its stage with
+#
+#     with timings.stage('name') as s:
+#         s.count('something')
+#         s.flight(id, seconds, fixes)
+#         s.timed('pages', name, seconds)
+#
+# and the record is merged into _out/build-timings.json.
+
+import contextlib
+import datetime
+import json
+import os
+import resource
+import time
+
+timings_file = "_out/build-timings.json"
+
+# number of flights or other items, sorted by time, kept in the record
+slowest = 20
+
+def cpu_time():
+    self = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return self.ru_utime + self.ru_stime + children.ru_utime + children.ru_stime
+
+def peak_rss():
+    # in bytes, of this process and its finished children
+    self = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return max(self.ru_maxrss, children.ru_maxrss) * 1024
+
+class Stage:
+    def __init__(self, name):
+        self.name = name
+        self.started = datetime.datetime.now().isoformat(timespec='seconds')
+        self.wall = time.perf_counter()
+        self.cpu = cpu_time()
+        self.counters = {}
+        # per group of items, like flights or pages, their times and values
+        self.items = {}
+
+    def count(self, name, n = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def timed(self, group, name, seconds, **values):
+        self.items.setdefault(group, {})[str(name)] = dict(seconds = seconds, **values)
+
+    def flight(self, id, seconds, fixes):
+        self.timed('flights', id, seconds, fixes = fixes)
+
+    def record(self):
+        record = {
+            'started': self.started,
+            'wall_time': time.perf_counter() - self.wall,
+            'cpu_time': cpu_time() - self.cpu,
+            'peak_rss': peak_rss(),
+            'counters': self.counters,
+        }
+        for group, items in self.items.items():
+            items = sorted(items.items(), key = lambda i: - i[1]['seconds'])
+            summary = { 'count': len(items) }
+            for key in items[0][1]:
+                summary[key] = sum(i[key] for _, i in items)
+            summary['slowest'] = dict(items[:slowest])
+            record[group] = summary
+        return record
+
+def write(name, record):
+    timings = {}
+    if os.path.exists(timings_file):
+        with open(timings_file) as f:
+            timings = json.load(f)
+    timings[name] = record
+    os.makedirs(os.path.dirname(timings_file), exist_ok=True)
+    tmp = f"{timings_file}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(timings, f, indent=True)
+    os.replace(tmp, timings_file)
+
+@contextlib.contextmanager
+def stage(name):
+    s = Stage(name)
+    try:
+        yield s
+    finally:
+        write(name, s.record())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+# Cache of parsed tracks, so that every IGC file is only parsed once.
+# Tracks are stored as .npy files in _tracks/, named by the hash of the
+# .igc.gz file, and are memory-mapped when loaded. On a miss the file is
+# streamed in chunks into the .npy, so memory does not grow with the track.
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+
+import igc
+
+cache_dir = "_tracks"
+
+# for the build timings
+counters = {'hits': 0, 'misses': 0, 'fixes': 0}
+
+# hashes by filename, with the size and mtime they were computed for
+digests = {}
+
+def digest(filename):
+    st = os.stat(filename)
+    key = (st.st_size, st.st_mtime_ns)
+    if filename in digests and digests[filename][0] == key:
+        return digests[filename][1]
+    with open(filename, 'rb') as f:
+        hash = hashlib.file_digest(f, 'sha256').hexdigest()
+    digests[filename] = (key, hash)
+    return hash
+
+def cache_file(filename, hash = None):
+    return f"{cache_dir}/{hash or digest(filename)}.npy"
+
+def write(filename, path):
+    # parses the file into a .npy at path, chunk by chunk
+    tmp = f"{path}.{os.getpid()}.tmp"
+    n = 0
+    with open(f"{tmp}.raw", 'wb') as raw:
+        for chunk in igc.stream(filename):
+            raw.write(chunk.tobytes())
+            n += len(chunk)
+    with open(tmp, 'wb') as f, open(f"{tmp}.raw", 'rb') as raw:
+        np.lib.format.write_array_header_1_0(f, {
+            'descr': np.lib.format.dtype_to_descr(igc.dtype), 'fortran_order': False, 'shape': (n,)})
+        shutil.copyfileobj(raw, f)
+    os.remove(f"{tmp}.raw")
+    os.replace(tmp, path)
+
+def load(filename, hash = None):
+    # hash is the digest of the file, if the caller already has it
+    path = cache_file(filename, hash)
+    try:
+        track = np.load(path, mmap_mode='r')
+        counters['hits'] += 1
+        counters['fixes'] += len(track)
+        return track
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(cache_dir, exist_ok=True)
+    write(filename, path)
+    track = np.load(path, mmap_mode='r')
+    counters['misses'] += 1
+    counters['fixes'] += len(track)
+    return track
+
+def prune():
+    with open("_tmp/flights.json") as f:
+        flights_data = json.load(f)
+    keep = set()
+    for flight in flights_data:
+        filename = f"_flights/{flight['IDFlight']}.igc.gz"
+        if os.path.exists(filename):
+            keep.add(os.path.basename(cache_file(filename)))
+
+    if not os.path.isdir(cache_dir):
+        return
+    for entry in os.listdir(cache_dir):
+        if entry not in keep:
+            print(f"Removing {cache_dir}/{entry}")
+            os.remove(f"{cache_dir}/{entry}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage the parsed track cache')
+    parser.add_argument('command', choices=['prune'],
+        help='prune: remove cached tracks of flights no longer in _tmp/flights.json')
+    args = parser.parse_args()
+
+    if args.command == 'prune':
+        prune()
@@ -1,42 +1,139 @@
 #!/usr/bin/env python3
 
 from itertools import combinations
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import sys
 import os
-import subprocess
 import json
-import shlex
-
-os.makedirs("_stats", exist_ok=True)
-with open("_tmp/flights.json") as f:
-    flights_data = json.load(f)
-
-# Group flights by date
-flights_by_date = {}
-for flight in flights_data:
-    date = flight["FlightDate"]
-    if date not in flights_by_date:
-        flights_by_date[date] = []
-    flights_by_date[date].append(flight)
-
-scripttime1 = max([
-    os.path.getmtime("./flightstats.py"),
-    os.path.getmtime("./constants.py"),
-])
-
-# Recalculate stats for all flights for which new data from that day is present
-for date in sorted(flights_by_date.keys()):
-    flights = flights_by_date[date]
-    print(f"Date: {date}")
-    newest = max([os.path.getmtime(f"_flights/{flight['IDFlight']}.igc.gz") for flight in flights])
-
-    for flight in flights:
-        id = flight["IDFlight"]
-        stats_file = f"_stats/{id}.stats.json"
-        stats_file_tmp = f"_stats/{id}.stats.json.tmp"
-        if not os.path.exists(stats_file) or \
-            os.path.getmtime(stats_file) < scripttime1 or \
-            os.path.getmtime(stats_file) < os.path.getmtime(f"_flights/{id}.igc.gz"):
-            print(f"Stats for flight {id}")
-            args = ["./flightstats.py", "-i", f"_flights/{id}.igc.gz"]
-            subprocess.run(args, stdout=open(stats_file_tmp, "w"), check=True)
-            subprocess.run(["mv", stats_file_tmp, stats_file])
+import argparse
+import cProfile
+import marshal
+import time
+import traceback
+
+import flightstats
+import statsdb
+import trackcache
+import kurbelpartner
+import luftraum
+import timings
+
+# where --profile puts the profiles of the slowest flights
+profile_dir = "_tmp/profiles"
+
+def update(id, hash, which, profile = False):
+    # results (or error), and timing info of one flight
+    before = dict(trackcache.counters)
+    profiler = cProfile.Profile() if profile else None
+    start = time.perf_counter()
+    try:
+        if profiler:
+            profiler.enable()
+        (results, error) = (flightstats.flightstats(f"_flights/{id}.igc.gz", which, hash), None)
+    except Exception:
+        (results, error) = (None, traceback.format_exc())
+    finally:
+        if profiler:
+            profiler.disable()
+    info = { name: trackcache.counters[name] - before[name] for name in before }
+    info['seconds'] = time.perf_counter() - start
+    if profiler:
+        profiler.create_stats()
+        info['profile'] = marshal.dumps(profiler.stats)
+    return (results, error, info)
+
+def update_partners(flights, all_stats, hashes):
+    try:
+        return (kurbelpartner.partners(flights, all_stats, hashes), None)
+    except Exception:
+        return (None, traceback.format_exc())
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Recalculate missing or outdated flight stats')
+    parser.add_argument('-j', '--jobs', type=int, default=len(os.sched_getaffinity(0)),
+        help='Number of worker processes (default: number of available cores)')
+    parser.add_argument('--profile', type=int, default=0, metavar='N',
+        help=f'Write cProfile data of the N slowest flights to {profile_dir}/')
+    args = parser.parse_args()
+
+    with open("_tmp/flights.json") as f:
+        flights_data = json.load(f)
+
+    with timings.stage('update-flightstats') as stage:
+        conn = statsdb.connect()
+
+        # Find out which analyzers need to run on which flight
+        hashes = { flight["IDFlight"]: trackcache.digest(f"_flights/{flight['IDFlight']}.igc.gz")
+            for flight in flights_data }
+        statsdb.set_flights(conn, hashes)
+        todo = {}
+        for id, hash in hashes.items():
+            which = statsdb.missing(conn, hash)
+            if which:
+                todo[id] = (hash, which)
+        stage.count('flights', len(flights_data))
+        stage.count('analyzed', len(todo))
+
+        # Airspaces that cannot be read are left out, not the flights
+        if any('luftraum' in which for (_, which) in todo.values()):
+            (_, _, skipped) = luftraum.load()
+            for (name, error) in skipped:
+                print(f"Airspace {name} skipped: {error}", file=sys.stderr)
+            stage.count('airspaces skipped', len(skipped))
+
+        print(f"Stats for {len(todo)} flights, using {args.jobs} processes")
+        failed = {}
+        profiles = []
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            futures = { executor.submit(update, id, hash, which, args.profile > 0): id for id, (hash, which) in todo.items() }
+            for future in as_completed(futures):
+                id = futures[future]
+                (results, error, info) = future.result()
+                stage.flight(id, info['seconds'], info['fixes'])
+                stage.count('track cache hits', info['hits'])
+                stage.count('track cache misses', info['misses'])
+                if 'profile' in info:
+                    profiles.append((info['seconds'], id, info['profile']))
+                    profiles = sorted(profiles, reverse=True)[:args.profile]
+                if error is None:
+                    print(f"Stats for flight {id}: {' '.join(results)}")
+                    statsdb.store(conn, todo[id][0], results)
+                else:
+                    print(f"Stats for flight {id} failed:\n{error}", file=sys.stderr)
+                    failed[str(id)] = error
+
+            # Kurbelpartner, per day, for days with new or changed flights
+            all_stats = statsdb.load_all(conn)
+            flights_by_date = {}
+            for flight in flights_data:
+                if str(flight["IDFlight"]) not in failed:
+                    flights_by_date.setdefault(flight["FlightDate"], []).append(flight)
+            futures = {}
+            for date, flights in flights_by_date.items():
+                digest = kurbelpartner.digest(flights, hashes)
+                if statsdb.partners_digest(conn, date) != digest:
+                    stats = { str(flight["IDFlight"]): all_stats[str(flight["IDFlight"])] for flight in flights }
+                    day_hashes = { flight["IDFlight"]: hashes[flight["IDFlight"]] for flight in flights }
+                    futures[executor.submit(update_partners, flights, stats, day_hashes)] = (date, digest)
+            stage.count('partner days', len(futures))
+            for future in as_completed(futures):
+                (date, digest) = futures[future]
+                (result, error) = future.result()
+                if error is None:
+                    print(f"Kurbelpartner for {date}")
+                    statsdb.store_partners(conn, date, digest, result)
+                else:
+                    print(f"Kurbelpartner for {date} failed:\n{error}", file=sys.stderr)
+                    failed[date] = error
+
+        if profiles:
+            os.makedirs(profile_dir, exist_ok=True)
+            for (seconds, id, profile) in profiles:
+                print(f"Profile of flight {id} ({seconds:.2f}s) in {profile_dir}/{id}.prof")
+                with open(f"{profile_dir}/{id}.prof", 'wb') as f:
+                    f.write(profile)
+        stage.count('failed', len(failed))
+
+    if failed:
+        print(f"Failed to compute stats for: {' '.join(sorted(failed))}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+
+# Indexes the comments of all flights for hike & fly, only files that changed
+
+import json
+import os
+
+import hikes
+import statsdb
+import timings
+import trackcache
+
+if __name__ == '__main__':
+    with open("_tmp/flights.json") as f:
+        flights_data = json.load(f)
+
+    with timings.stage('update-hikes') as stage:
+        conn = statsdb.connect()
+        comments = {}
+        for flight in flights_data:
+            id = flight["IDFlight"]
+            filename = f"_flights/{id}.comments.json"
+            if flight['CountComments'] == "0" or not os.path.exists(filename):
+                comments[id] = None
+                continue
+            hash = trackcache.digest(filename)
+            comments[id] = hash
+            stage.count('comments files')
+            if statsdb.hikes_current(conn, hash):
+                continue
+            with open(filename) as f:
+                authors = hikes.authors(json.load(f))
+            print(f"Hikes for flight {id}: {' '.join(authors)}")
+            statsdb.store_hikes(conn, hash, authors)
+            stage.count('indexed')
+        statsdb.set_comments(conn, comments)
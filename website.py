@@ -4,30 +4,23 @@
 
 import json
 import os
-import jinja2
 import math
 import shutil
 import datetime
-import re
 import numpy as np
 import pandas as pd
 import folium
-import csv
+import argparse
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import constants
+import render
+import scoring
+import statsdb
+import timings
 
-now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-hike_and_fly_re = re.compile(r'\bhike\b', re.IGNORECASE)
-
-from jinja2 import Environment, FileSystemLoader, select_autoescape
-env = Environment(
-    loader=FileSystemLoader("templates"),
-    autoescape=select_autoescape()
-)
-
-def full_name(f):
-    return f['FirstName'] + ' ' + f['LastName']
+full_name = scoring.full_name
 
 def pretty_duration(s):
     s = int(s)
@@ -44,293 +37,232 @@ def pretty_landepunktabstand(d):
     else:
         return ""
 
-# prepare output directory
-
-try:
-    os.mkdir('_out')
-except FileExistsError:
-    pass
-shutil.copytree('templates/static', '_out/static', dirs_exist_ok=True)
-
-# Last year's points
-old_data = json.load(open('data2024.json'))
-old_points = {}
-for pilot_data in old_data["pilots"]:
-    if pilot_data["stats"]["flighttime"] >= 3600:
-        old_points[pilot_data["pid"]] = pilot_data["points"]["total"]
-
-# Last year's median
-# (TODO)
-
-
-flight_data = json.load(open('_tmp/flights.json'))
-
-flights = {}
-# Group flights by pilot, read stats
-for flight in flight_data:
-    id = flight['IDFlight']
-    pid = str(flight['FKPilot'])
-
-    # add stats
-    #print(f"Reading stats for {id}")
-    flight['stats'] = json.load(open(f'_stats/{id}.stats.json'))
-
-    if pid not in flights:
-        flights[pid] = []
-    flights[pid].append(flight)
-
-# Sort by date
-for pid, pflights in flights.items():
-    pflights.sort(key = lambda f: f['FlightStartTime'])
-
-# Latest flight
-if flight_data:
-    latest_flight = max([f['FlightStartTime'] for f in flight_data])
-else:
-    latest_flight = "(noch keinen gesehen)"
-
-def finalize_stats(stats, covered):
-    stats['sektoren'] = len(covered)
-    if stats['left_turns'] > stats['right_turns']:
-        stats['drehrichtung'] = "(nach links)"
-        stats['drehueberschuss'] = stats['left_turns'] - stats['right_turns']
-    elif stats['left_turns'] < stats['right_turns']:
-        stats['drehrichtung'] = "(nach rechts)"
-        stats['drehueberschuss'] = stats['right_turns'] - stats['left_turns']
-    stats['prettyflighttime'] = pretty_duration(stats['flighttime'])
-
-def points_of_stats(stats):
-    points = {
-        'schauiflights':   stats['schauiflights']   * 5,
-        'lindenflights':   stats['lindenflights']   * 5,
-        'flighttime':      stats['flighttime']      // 60,
-        'hikes':           stats['hikes']           * 120,
-        'fotos':           stats['fotos']           * 3,
-        'sektoren':        stats['sektoren']        * 23,
-        #'landepunkt1':     stats['landepunkt1']     * 100,
-        #'landepunkt2':     stats['landepunkt2']     * 25,
-        #'landepunkt3':     stats['landepunkt3']     * 5,
-        'drehueberschuss': stats['drehueberschuss'] * -1,
-        'sonderwertung':   stats['sonderwertung']   * 400,
-    }
-    points['total'] = sum(points.values())
-    return points
-
-# Create per pilot website, and gather stats
-pilots = []
-pilottemplate = env.get_template("pilot.html")
-sektor_pilots = {}
-sektor_flights = {}
-all_flights = []
-for pid, pflights in flights.items():
-    name = full_name(pflights[0])
-    covered = set()
-
-    # stats
-    stats = {
-        'schauiflights': 0,
-        'lindenflights': 0,
-        'flighttime': 0,
-        'hikes': 0,
-        'fotos': 0,
-        'sektoren': 0,
-        #'landepunkt1': 0,
-        #'landepunkt2': 0,
-        #'landepunkt3': 0,
-        'drehrichtung': "",
-        'drehueberschuss': 0,
-        'left_turns': 0,
-        'right_turns': 0,
-        'sonderwertung': 0,
+def compact(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def summary(p):
+    return {
+        'pid': p['pid'],
+        'name': p['name'],
+        'rank': p['rank'],
+        'stats': { k: v for k, v in p['stats'].items() if k != 'kurbelpartner' },
+        'points': p['points'],
+        'shard': f"pilot{p['pid']}.json",
     }
 
-    # if pid == '10564':
-    #     stats['sonderwertung'] += 1
-    # if pid == '14869':
-    #     stats['sonderwertung'] += 3
-    # if pid == '12218':
-    #     stats['sonderwertung'] += 2
-    # if pid == '771':
-    #     stats['sonderwertung'] += 1
-    if pid == '14475':
-      stats['sonderwertung'] += 1  
-    if pid == '14679':
-      stats['sonderwertung'] += 1  
-
-    data = {}
-    # data['lpradius1'] = constants.lpradius1
-    # data['lpradius2'] = constants.lpradius2
-    # data['lpradius3'] = constants.lpradius3
-    data['flights'] = []
-    for n, f in enumerate(pflights):
-        id = f['IDFlight']
-
-        sektoren = f['stats']['sektoren']
-        for s in sektoren:
-            if s not in sektor_flights:
-                sektor_flights[s] = 0
-            sektor_flights[s] += 1
-
-        # Neue sektoren
-        new = set(sektoren).difference(covered)
-        covered.update(new)
-
-        # update stats
-        stats['flighttime'] += int(f['FlightDuration'])
-        stats['left_turns'] += f['stats']['left_turns']
-        stats['right_turns'] += f['stats']['right_turns']
-        # if f['stats']['landepunktabstand'] < constants.lpradius1:
-        #     stats['landepunkt1'] += 1
-        # elif f['stats']['landepunktabstand'] < constants.lpradius2:
-        #     stats['landepunkt2'] += 1
-        # elif f['stats']['landepunktabstand'] < constants.lpradius3:
-        #     stats['landepunkt3'] += 1
-
-        if f['TakeoffWaypointName'] == "Schauinsland":
-            stats['schauiflights'] += 1
-        if f['TakeoffWaypointName'] == "Lindenberg":
-            stats['lindenflights'] += 1
-
-        is_hike = False
-        if f['TakeoffWaypointName'] == "Schauinsland" and int(f['CountComments']) > 0:
-            comments = json.load(open(f'_flights/{id}.comments.json'))
-            for c in comments['data']:
-                if str(c['FKAuthor']) == pid and bool(hike_and_fly_re.search(c["CommentText"])):
-                    is_hike = True
-
-        if is_hike:
-            stats['hikes'] += 1
-
-        has_fotos = int(f['HasPhotos']) > 0
-        if has_fotos:
-            stats['fotos'] += 1
-
-        fd = {
-          'pid': pid,
-          'name': name,
-          'n': n+1,
-          'id': id,
-          'datum': datetime.date.fromisoformat(f['FlightDate']).strftime("%d.%m."),
-          'landeplatz': f['TakeoffWaypointName'],
-          'flugzeit_sekunden': f['FlightDuration'],
-          'flugzeit': pretty_duration(f['FlightDuration']),
-          'linkskreise': f['stats']['left_turns'],
-          'rechtskreise': f['stats']['right_turns'],
-          #'landepunktabstand_meter': f['stats']['landepunktabstand'],
-          #'landepunktabstand': pretty_landepunktabstand(f['stats']['landepunktabstand']),
-          'neue_sektoren': " ".join(sorted(list(new))),
-          'neue_sektoren_anzahl': len(new),
-          'fotos': has_fotos,
-          'hike': is_hike,
-          'url': f"https://de.dhv-xc.de/flight/{id}",
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generates the website')
+    parser.add_argument('--incremental', action='store_true',
+        help='Only re-render pilot pages whose data changed since the last run')
+    parser.add_argument('-j', '--jobs', type=int, default=len(os.sched_getaffinity(0)),
+        help='Number of processes rendering pilot pages (default: number of available cores)')
+    args = parser.parse_args()
+
+    stage = timings.Stage('website')
+
+    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    # prepare output directory
+
+    try:
+        os.mkdir('_out')
+    except FileExistsError:
+        pass
+    shutil.copytree('templates/static', '_out/static', dirs_exist_ok=True)
+
+    # Digests of the data each pilot page was rendered from
+    digests_file = '_tmp/website-digests.json'
+    old_digests = {}
+    if args.incremental and os.path.exists(digests_file):
+        old_digests = json.load(open(digests_file))
+    digests = {}
+
+    templates_digest = hashlib.sha256()
+    for template in sorted(os.listdir('templates')):
+        if template.endswith('.html'):
+            templates_digest.update(open(f'templates/{template}', 'rb').read())
+
+    # Last year's points
+    old_data = json.load(open('data2024.json'))
+    old_points = {}
+    for pilot_data in old_data["pilots"]:
+        if pilot_data["stats"]["flighttime"] >= 3600:
+            old_points[pilot_data["pid"]] = pilot_data["points"]["total"]
+
+    # Last year's median
+    # (TODO)
+
+
+    flight_data = json.load(open('_tmp/flights.json'))
+    all_stats = statsdb.load_all()
+    flights_by_id = { str(flight['IDFlight']): flight for flight in flight_data }
+
+    # Scoring
+    hikes = scoring.hikes(flight_data, statsdb.load_hikes())
+    table = scoring.flights(flight_data, all_stats, hikes)
+    new = scoring.new_sektoren(table)
+    pilot_stats = scoring.pilot_stats(table, new)
+    pilot_points = scoring.points_of_stats(pilot_stats)
+    pilot_points['relative'] = scoring.relative_points(pilot_points, old_points)
+    order = scoring.ranking(pilot_points)
+
+    # Neue sektoren of each flight
+    table['neue_sektoren'] = new.groupby('flight')['sektor'] \
+        .agg(lambda s: " ".join(sorted(s))).reindex(table.index, fill_value = "")
+    table['neue_sektoren_anzahl'] = new.groupby('flight').size().reindex(table.index, fill_value = 0)
+
+    # Kurbelpartner of each pilot, sorted by name
+    partners = table[['pid', 'kurbelpartner']].explode('kurbelpartner').dropna()
+    partners = pd.DataFrame({
+        'pid': partners['pid'].to_numpy(),
+        'partner': [ str(flights_by_id[str(id)]['FKPilot']) for id in partners['kurbelpartner'] ],
+        'name': [ full_name(flights_by_id[str(id)]) for id in partners['kurbelpartner'] ],
+    }).drop_duplicates(['pid', 'partner']).sort_values('name', kind = 'stable')
+    kurbelpartner = { pid: [ {'pid': p, 'name': n} for (p, n) in zip(g['partner'], g['name']) ]
+        for pid, g in partners.groupby('pid', sort = False) }
+
+    # Latest flight
+    if flight_data:
+        latest_flight = max([f['FlightStartTime'] for f in flight_data])
+    else:
+        latest_flight = "(noch keinen gesehen)"
+
+    stat_keys = ['schauiflights', 'lindenflights', 'flighttime', 'hikes', 'fotos', 'sektoren',
+        'drehrichtung', 'drehueberschuss', 'left_turns', 'right_turns', 'sonderwertung']
+    point_keys = ['schauiflights', 'lindenflights', 'flighttime', 'hikes', 'fotos', 'sektoren',
+        'drehueberschuss', 'sonderwertung', 'total']
+
+    # Create per pilot website, and gather stats
+    pilots = {}
+    pages = []
+    shards = {}
+    pilot_stats_records = pilot_stats.to_dict('index')
+    pilot_points_records = pilot_points.to_dict('index')
+    for _, pflights in table.groupby('pilot', sort = True):
+        pid = pflights['pid'].iloc[0]
+        name = pflights['name'].iloc[0]
+
+        stats = { k: pilot_stats_records[pid][k] for k in stat_keys }
+        stats['kurbelpartner'] = kurbelpartner.get(pid, [])
+        stats['prettyflighttime'] = pretty_duration(stats['flighttime'])
+
+        points = { k: pilot_points_records[pid][k] for k in point_keys }
+        if pid in old_points:
+            points["old"] = old_points[pid]
+            points["relative"] = pilot_points_records[pid]['relative']
+        else:
+            points["relative"] = None
+
+        pilots[pid] = {
+            'pid': pid,
+            'name': name,
+            'stats': stats,
+            'points': points,
         }
-        data['flights'].append(fd)
-        all_flights.append(fd)
 
-    # Finalize stats
-    finalize_stats(stats, covered)
-
-    # Sektor heat map
-    for s in covered:
-        if s not in sektor_pilots:
-            sektor_pilots[s] = 0
-        sektor_pilots[s] += 1
-
-    # Calculate points
-    points = points_of_stats(stats)
-
-    # Relative points
-    if pid in old_points:
-        points["old"] = old_points[pid]
-        points["relative"] = points["total"] / old_points[pid]
-    else:
-        points["relative"] = None
-
-    pilots.append({
-        'pid': pid,
-        'name': name,
-        'stats': stats,
-        'points': points,
-    })
-
-    # Write per-pilot website
-    data['pid'] = pid
-    data['name'] = name
-    data['stats'] = stats
-    data['points'] = points
+        data = {}
+        # data['lpradius1'] = constants.lpradius1
+        # data['lpradius2'] = constants.lpradius2
+        # data['lpradius3'] = constants.lpradius3
+        data['flights'] = []
+        for f in pflights.to_dict('records'):
+            id = f['id']
+            fd = {
+              'pid': pid,
+              'name': name,
+              'n': f['n'],
+              'id': id,
+              'datum': datetime.date.fromisoformat(f['date']).strftime("%d.%m."),
+              'landeplatz': f['takeoff'],
+              'flugzeit_sekunden': flights_by_id[str(id)]['FlightDuration'],
+              'flugzeit': pretty_duration(f['duration']),
+              'linkskreise': f['left_turns'],
+              'rechtskreise': f['right_turns'],
+              #'landepunktabstand_meter': f['stats']['landepunktabstand'],
+              #'landepunktabstand': pretty_landepunktabstand(f['stats']['landepunktabstand']),
+              'neue_sektoren': f['neue_sektoren'],
+              'neue_sektoren_anzahl': f['neue_sektoren_anzahl'],
+              'fotos': f['fotos'],
+              'hike': f['hike'],
+              'url': f"https://de.dhv-xc.de/flight/{id}",
+            }
+            data['flights'].append(fd)
+
+        # Write per-pilot website, unless it is unchanged
+        data['pid'] = pid
+        data['name'] = name
+        data['stats'] = stats
+        data['points'] = points
+        data['latest_flight'] = pflights['start'].iloc[-1]
+        shards[pid] = data
+        digest = templates_digest.copy()
+        digest.update(json.dumps(data, sort_keys=True).encode())
+        digests[pid] = digest.hexdigest()
+        if old_digests.get(pid) == digests[pid] and os.path.exists(f'_out/pilot{pid}.html'):
+            continue
+        pages.append(("pilot.html", data, f'_out/pilot{pid}.html'))
+
+    # Render pilot pages in parallel
+    written = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        for future in as_completed([ executor.submit(render.render, *page) for page in pages ]):
+            (filename, changed, seconds) = future.result()
+            stage.timed('pages', filename, seconds, written = changed)
+            written += changed
+
+    print(f"Pilot pages: {len(pages)} rendered, {len(pilots) - len(pages)} skipped, {written} written")
+    stage.count('pilot pages rendered', len(pages))
+    stage.count('pilot pages skipped', len(pilots) - len(pages))
+    stage.count('pilot pages written', written)
+    with open(digests_file, 'w') as f:
+        json.dump(digests, f)
+
+    # Rank pilots
+    def ranked(pids):
+        return [ dict(pilots[pid], rank = i + 1) for i, pid in enumerate(pids) ]
+
+    ranked_points = pilot_points.loc[order]
+    pilots_new = ranked(ranked_points.index[ranked_points['relative'].isna()])
+    pilots_rel = ranked(scoring.ranking(ranked_points.dropna(subset = ['relative']), 'relative'))
+    pilots = ranked(order)
+
+    # Turn statistics
+    turn_stats = scoring.turn_stats(pilot_stats.loc[order])
+
+    # Write main website
+    data = {}
+    data['pilots'] = pilots
+    data['pilots_new'] = pilots_new
+    data['pilots_rel'] = pilots_rel
     data['now'] = now
     data['latest_flight'] = latest_flight
     data['count_flight'] = len(flight_data)
-    pilottemplate\
-      .stream(data) \
-      .dump(open(f'_out/pilot{pid}.html', 'w'))
-
-
-# Sort pilots
-pilots.sort(key = lambda p: - p['points']['total'])
-for i, p in enumerate(pilots):
-    p['rank'] = i + 1
-
-pilots_new = [ p.copy() for p in pilots if p['points']["relative"] is None ]
-for i, p in enumerate(pilots_new):
-    p['rank'] = i + 1
-
-pilots_rel = [ p.copy() for p in pilots if p['points']["relative"] is not None ]
-pilots_rel.sort(key = lambda p: - p['points']['relative'])
-for i, p in enumerate(pilots_rel):
-    p['rank'] = i + 1
-
-# Turn statistics
-turn_stats = {
-  'least_rel_diff': min(
-    [ (p['name'], p['pid'],
-      100 * abs(p['stats']['left_turns'] - p['stats']['right_turns']) / \
-      (p['stats']['left_turns'] + p['stats']['right_turns']))
-    for p in pilots if (p['stats']['left_turns'] + p['stats']['right_turns']) > 100
-    ], key = lambda pair: pair[2]),
-  'max_rel_diff_left': max(
-    [ (p['name'], p['pid'],
-      100 * (p['stats']['left_turns'] - p['stats']['right_turns']) / \
-      (p['stats']['left_turns'] + p['stats']['right_turns']))
-    for p in pilots if (p['stats']['left_turns'] + p['stats']['right_turns']) > 100
-    ], key = lambda pair: pair[2]),
-  'max_abs_diff_left': max(
-    [ (p['name'], p['pid'], (p['stats']['left_turns'] - p['stats']['right_turns']))
-    for p in pilots if (p['stats']['left_turns'] + p['stats']['right_turns']) > 100
-    ], key = lambda pair: pair[2]),
-  'max_rel_diff_right': max(
-    [ (p['name'], p['pid'],
-      100 * (p['stats']['right_turns'] - p['stats']['left_turns']) / \
-      (p['stats']['left_turns'] + p['stats']['right_turns']))
-    for p in pilots if (p['stats']['left_turns'] + p['stats']['right_turns']) > 100
-    ], key = lambda pair: pair[2]),
-  'max_abs_diff_right': max(
-    [ (p['name'], p['pid'], (p['stats']['right_turns'] - p['stats']['left_turns']))
-    for p in pilots if (p['stats']['left_turns'] + p['stats']['right_turns']) > 100
-    ], key = lambda pair: pair[2]),
-}
-
-# Write main website
-data = {}
-data['pilots'] = pilots
-data['pilots_new'] = pilots_new
-data['pilots_rel'] = pilots_rel
-data['now'] = now
-data['latest_flight'] = latest_flight
-data['count_flight'] = len(flight_data)
-data['turn_stats'] = turn_stats
-env.get_template("index.html") \
-  .stream(data) \
-  .dump(open(f'_out/index.html', 'w'))
-
-# Write main data as CSV
-with open('_out/data.json', 'w', encoding='utf-8') as f:
-    json.dump(data, f, ensure_ascii=False, indent=4)
-
-# Write Flight data to CSV file
-
-with open('flights.csv', 'w', newline='') as csvfile:
-    w = csv.DictWriter(csvfile, all_flights[0].keys())
-    w.writeheader()
-    for fd in all_flights:
-        w.writerow(fd)
+    data['turn_stats'] = turn_stats
+    (filename, changed, seconds) = render.render("index.html", data, '_out/index.html')
+    stage.timed('pages', filename, seconds, written = changed)
+
+    # Write main data, as a small index and a shard per pilot
+    data_dir = '_out/data'
+    os.makedirs(data_dir, exist_ok=True)
+
+    index = {
+        'pilots': [ summary(p) for p in pilots ],
+        'pilots_new': [ {'pid': p['pid'], 'rank': p['rank']} for p in pilots_new ],
+        'pilots_rel': [ {'pid': p['pid'], 'rank': p['rank']} for p in pilots_rel ],
+        'now': now,
+        'latest_flight': latest_flight,
+        'count_flight': len(flight_data),
+        'turn_stats': turn_stats,
+    }
+    render.write_if_changed(f'{data_dir}/index.json', compact(index))
+    shards_written = 0
+    for pid, shard in shards.items():
+        shards_written += render.write_if_changed(f'{data_dir}/pilot{pid}.json', compact(shard))
+    for filename in os.listdir(data_dir):
+        if filename.startswith('pilot') and filename[len('pilot'):].split('.')[0] not in shards:
+            os.remove(f'{data_dir}/{filename}')
+    print(f"Data shards: {len(shards)}, {shards_written} written")
+    stage.count('data shards written', shards_written)
+
+    stage.count('flights', len(flight_data))
+    timings.write('website', stage.record())
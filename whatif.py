@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+# Rescores the season with another ring layout, from the polar cells of the
+# flights in the stats store, and prints both leaderboards side by side.
+#
+# Both leaderboards are computed from the cells, so that the differences come
+# from the layout only and not from the quantization of the cells.
+
+import argparse
+import json
+import sys
+
+import constants
+import polarzellen
+import scoring
+import statsdb
+
+def leaderboard(flight_data, all_stats, hikes, cells, layout):
+    # (ranked pids, points, stats) with the sectors of layout
+    stats = { id: dict(s, sektoren = polarzellen.sektoren_of_cells(cells[id], layout))
+        for id, s in all_stats.items() }
+    table = scoring.flights(flight_data, stats, hikes)
+    pilot_stats = scoring.pilot_stats(table)
+    points = scoring.points_of_stats(pilot_stats)
+    return (scoring.ranking(points), points, pilot_stats)
+
+def describe(layout):
+    (radius, segments, offset) = layout
+    return f"{len(radius)} Ringe bis {radius[-1]:.1f} km, {1 + sum(segments)} Sektoren"
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rescore the season with another sector layout')
+    parser.add_argument('--rings', type=int, default=constants.rings,
+        help=f'Number of rings (default: {constants.rings})')
+    parser.add_argument('--r0', type=float, default=constants.r0,
+        help=f'Radius of the innermost ring in km (default: {constants.r0})')
+    parser.add_argument('--dr0', type=float, default=constants.dr0,
+        help=f'Width of the second ring in km (default: {constants.dr0})')
+    parser.add_argument('--drf', type=float, default=constants.drf,
+        help=f'Factor by which each ring is wider than the last (default: {constants.drf:.4f})')
+    parser.add_argument('-n', '--top', type=int, default=None,
+        help='Only show the first N pilots of the new leaderboard')
+    args = parser.parse_args()
+
+    with open("_tmp/flights.json") as f:
+        flight_data = json.load(f)
+
+    conn = statsdb.connect()
+    all_stats = statsdb.load_all(conn)
+    cells = statsdb.load_array('polarzellen', 'u4', conn)
+    missing = [ f['IDFlight'] for f in flight_data
+        if str(f['IDFlight']) not in cells or str(f['IDFlight']) not in all_stats ]
+    if missing:
+        print(f"No polar cells for {len(missing)} flights, run ./update-flightstats.py first", file=sys.stderr)
+        sys.exit(1)
+    hikes = scoring.hikes(flight_data, statsdb.load_hikes(conn))
+
+    old_layout = constants.layout(constants.rings, constants.r0, constants.dr0, constants.drf)
+    new_layout = constants.layout(args.rings, args.r0, args.dr0, args.drf)
+    (old_order, old_points, old_stats) = leaderboard(flight_data, all_stats, hikes, cells, old_layout)
+    (new_order, new_points, new_stats) = leaderboard(flight_data, all_stats, hikes, cells, new_layout)
+    old_rank = { pid: i + 1 for i, pid in enumerate(old_order) }
+
+    print(f"Jetzt: {describe(old_layout)}")
+    print(f"Neu:   {describe(new_layout)}")
+    print()
+    print(f"{'':24} {'Jetzt':>21}   {'Neu':>21}")
+    print(f"{'Pilot':24} {'Rang':>5} {'Punkte':>7} {'Sekt.':>7}   {'Rang':>5} {'Punkte':>7} {'Sekt.':>7} {'':>4}")
+    for i, pid in enumerate(new_order[:args.top]):
+        change = old_rank[pid] - (i + 1)
+        print(f"{new_stats.at[pid, 'name'][:24]:24} "
+            f"{old_rank[pid]:5} {old_points.at[pid, 'total']:7} {old_stats.at[pid, 'sektoren']:7}   "
+            f"{i + 1:5} {new_points.at[pid, 'total']:7} {new_stats.at[pid, 'sektoren']:7} "
+            f"{'' if change == 0 else f'{change:+d}':>4}")
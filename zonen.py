@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+# Zones of any shape, and which of them a track touches
+#
+# Zones are polygons from GeoJSON (like sektoren.json) or OpenAir (like
+# sektoren-airspace.txt). They are projected onto the tangent plane at schaui,
+# in metres, and kept in an STRtree. A track is assigned to zones in bulk: the
+# tree gives the candidate zones of runs of consecutive fixes, by their bounding
+# box, and contains_xy the exact answer for every fix of the run.
+
+import argparse
+import json
+import sys
+import numpy as np
+import shapely
+import shapely.geometry
+
+import igc
+import openair
+import sektoren
+import trackcache
+
+# fixes per run; creating a geometry per fix would take longer than the lookup
+run_length = 16
+
+def project_lonlat(coords):
+    # for shapely.transform, coords are (lon, lat) rows
+    return np.column_stack(sektoren.project(coords[:,1], coords[:,0]))
+
+class Zonen:
+    def __init__(self, names, geometries):
+        # geometries in lon/lat
+        self.names = list(names)
+        self.geometries = shapely.transform(np.asarray(geometries, dtype=object), project_lonlat)
+        shapely.prepare(self.geometries)
+        self.tree = shapely.STRtree(self.geometries)
+
+    def __len__(self):
+        return len(self.names)
+
+    def hits(self, lat, lon):
+        # (fix index, zone index) of every fix inside a zone, in no particular order
+        (x, y) = sektoren.project(np.asarray(lat, dtype='f8'), np.asarray(lon, dtype='f8'))
+        if len(x) == 0:
+            return (np.zeros(0, np.intp), np.zeros(0, np.intp))
+        starts = np.arange(0, len(x), run_length)
+        boxes = shapely.box(
+            np.minimum.reduceat(x, starts), np.minimum.reduceat(y, starts),
+            np.maximum.reduceat(x, starts), np.maximum.reduceat(y, starts))
+        (run, zone) = self.tree.query(boxes)
+
+        # each candidate zone of a run, for all fixes of the run
+        first = starts[run]
+        lengths = np.minimum(first + run_length, len(x)) - first
+        fix = np.repeat(first, lengths) + np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        zone = np.repeat(zone, lengths)
+        inside = shapely.contains_xy(self.geometries[zone], x[fix], y[fix])
+        return (fix[inside], zone[inside])
+
+    def zonen(self, track):
+        # names of the zones the track touches, sorted
+        (_, zone) = self.hits(igc.column(track, 'lat'), igc.column(track, 'lon'))
+        return sorted({ self.names[z] for z in np.unique(zone).tolist() })
+
+def from_geojson(data):
+    # from a GeoJSON FeatureCollection, zones named by id or properties.name
+    names = []
+    geometries = []
+    for (i, feature) in enumerate(data['features']):
+        name = feature.get('id', (feature.get('properties') or {}).get('name', str(i)))
+        names.append(str(name))
+        geometries.append(shapely.geometry.shape(feature['geometry']))
+    return Zonen(names, geometries)
+
+def from_openair(text):
+    names = []
+    geometries = []
+    for airspace in openair.parse(text):
+        if 'error' in airspace:
+            print(f"Skipping {airspace['name']}: {airspace['error']}", file=sys.stderr)
+        elif len(airspace['points']) >= 3:
+            names.append(airspace['name'])
+            geometries.append(shapely.Polygon([ (lon, lat) for (lat, lon) in airspace['points'] ]))
+    return Zonen(names, geometries)
+
+def load(filename):
+    # GeoJSON if the file looks like JSON, OpenAir otherwise
+    with open(filename) as f:
+        text = f.read()
+    if text.lstrip().startswith('{'):
+        return from_geojson(json.loads(text))
+    return from_openair(text)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Lists the zones that flights touch')
+    parser.add_argument('zones', help='Zones as GeoJSON or OpenAir file')
+    parser.add_argument('flights', nargs='+', help='Gzipped IGC files')
+    args = parser.parse_args()
+
+    zonen = load(args.zones)
+    for filename in args.flights:
+        print(f"{filename}: {' '.join(zonen.zonen(trackcache.load(filename)))}")